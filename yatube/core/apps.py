@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.core.cache import cache
+from django.db.models.signals import post_migrate
+
+
+def clear_cache(**kwargs):
+    # Кеш переживает перезапуски и общий у всех процессов: после
+    # миграций в нём могут остаться данные прежней базы или схемы.
+    # У тестов свой файл кеша (см. TESTING в настройках), так что
+    # создание тестовой базы очищает только его.
+    cache.clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Сигнал приходит только приложениям с моделями, а у core их
+        # нет, поэтому обработчик слушает миграции всех приложений.
+        post_migrate.connect(clear_cache, dispatch_uid='core.clear_cache')
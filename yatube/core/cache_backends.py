@@ -0,0 +1,296 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Как хранится значение в столбце value.
+PICKLED, COMPRESSED, INTEGER = 0, 1, 2
+# Целые, помещающиеся в INTEGER SQLite.
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' kind INTEGER NOT NULL,'
+    ' value BLOB NOT NULL,'
+    ' size INTEGER NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_totals VALUES (1, 0, 0)',
+    # Итоги ведут триггеры, чтобы проверка границ не считала таблицу.
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_totals SET entries = entries + 1,'
+    ' size = size + NEW.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_totals SET entries = entries - 1,'
+    ' size = size - OLD.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_totals SET size = size - OLD.size + NEW.size; END',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов на одной машине.
+
+    LOCATION - путь к файлу. Кроме MAX_ENTRIES в OPTIONS задаются:
+
+    MAX_SIZE - предел суммарного размера значений в байтах;
+    COMPRESS_MIN_SIZE - значения не короче этого сжимаются zlib,
+    None отключает сжатие.
+
+    При выходе за любой из пределов вытесняются давно не читавшиеся
+    ключи, а с ними CULL_FREQUENCY-я доля запаса, чтобы не чистить
+    таблицу на каждой записи. Время чтения обновляется не чаще раза
+    в ACCESS_RESOLUTION секунд, иначе каждое чтение было бы записью.
+    Целые числа хранятся как есть, поэтому incr - один UPDATE под
+    блокировкой базы и не теряет приращения из разных процессов.
+    """
+    ACCESS_RESOLUTION = 1
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        compress_min_size = options.get('COMPRESS_MIN_SIZE', 1024)
+        self._compress_min_size = (
+            None if compress_min_size is None else int(compress_min_size)
+        )
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после
+        # fork: делить соединение SQLite между ними нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+        return self._local.db
+
+    @contextmanager
+    def _write(self):
+        """Транзакция, сразу берущая блокировку записи."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _encode(self, value):
+        if (isinstance(value, int) and not isinstance(value, bool)
+                and value in INTEGER_RANGE):
+            return INTEGER, value, 8
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if (self._compress_min_size is not None
+                and len(data) >= self._compress_min_size):
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                return COMPRESSED, packed, len(packed)
+        return PICKLED, data, len(data)
+
+    @staticmethod
+    def _decode(kind, value):
+        if kind == INTEGER:
+            return value
+        if kind == COMPRESSED:
+            value = zlib.decompress(value)
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _row(self, key, value, timeout, now):
+        kind, data, size = self._encode(value)
+        return key, kind, data, size, self.get_backend_timeout(timeout), now
+
+    def _cull(self, db, now):
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        if not self._cull_frequency:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        over_entries = entries - self._max_entries
+        if over_entries > 0:
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (over_entries + self._max_entries // self._cull_frequency,),
+            )
+            # Вытесненные по числу ключи уже освободили место.
+            size, = db.execute('SELECT size FROM cache_totals').fetchone()
+        target = self._max_size - self._max_size // self._cull_frequency
+        if size > self._max_size:
+            # Вытесняем старые ключи, пока их размер не покроет излишек.
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, size, SUM(size) OVER ('
+                '   ORDER BY accessed, key) AS running FROM cache'
+                ' ) WHERE running - size < ?)',
+                (size - target,),
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self._row(key, value, timeout, now)
+        with self._write() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?, ?, ?)', row
+            ).rowcount == 1
+            if added:
+                self._cull(db, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        values = self._get_many(list(keys))
+        return {keys[key]: value for key, value in values.items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        db = self._db
+        placeholders = ', '.join('?' * len(keys))
+        rows = db.execute(
+            f'SELECT key, kind, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, now),
+        ).fetchall()
+        stale = [
+            key for key, _, _, accessed in rows
+            if now - accessed >= self.ACCESS_RESOLUTION
+        ]
+        if stale:
+            placeholders = ', '.join('?' * len(stale))
+            db.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                (now, *stale),
+            )
+        return {key: self._decode(kind, value) for key, kind, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [
+            self._row(self._key(key, version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        if not rows:
+            return []
+        with self._write() as db:
+            db.executemany(
+                'INSERT INTO cache VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET kind = excluded.kind, '
+                'value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed',
+                rows,
+            )
+            self._cull(db, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        return self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = db.execute(
+                'SELECT kind, value FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            kind, value = row
+            if kind == INTEGER:
+                db.execute(
+                    'UPDATE cache SET value = value + ?, accessed = ? '
+                    'WHERE key = ?',
+                    (delta, now, key),
+                )
+                value += delta
+            else:
+                value = self._decode(kind, value) + delta
+                kind, data, size = self._encode(value)
+                db.execute(
+                    'UPDATE cache SET kind = ?, value = ?, size = ?, '
+                    'accessed = ? WHERE key = ?',
+                    (kind, data, size, now, key),
+                )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        if keys:
+            with self._write() as db:
+                db.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
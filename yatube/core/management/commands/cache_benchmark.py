@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+BATCH_SIZE = 10
+
+
+def sqlite_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options, 'TIMEOUT': None})
+
+
+def increment(path, count):
+    cache = sqlite_cache(path)
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость SQLiteCache и LocMemCache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=5000,
+            help='Сколько операций каждого вида выполнить.',
+        )
+        parser.add_argument(
+            '--value-size',
+            type=int,
+            default=8192,
+            help='Размер значения в байтах, похожего на HTML страницы.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=4,
+            help='Сколько процессов одновременно увеличивают один ключ.',
+        )
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        value = self.make_value(options['value_size'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite3')
+            backends = {
+                'LocMemCache': LocMemCache(
+                    'benchmark', {'OPTIONS': {'MAX_ENTRIES': operations * 2}}
+                ),
+                'SQLiteCache': sqlite_cache(
+                    path, MAX_ENTRIES=operations * 2
+                ),
+                'SQLiteCache без сжатия': sqlite_cache(
+                    path + '-raw', MAX_ENTRIES=operations * 2,
+                    COMPRESS_MIN_SIZE=None,
+                ),
+            }
+            for name, cache in backends.items():
+                self.stdout.write(name)
+                for operation, seconds in self.measure(
+                        cache, operations, value):
+                    self.stdout.write(
+                        f'  {operation:<10} {operations / seconds:>10.0f}'
+                        f' оп/с'
+                    )
+            self.stdout.write(self.measure_processes(
+                path, operations, options['processes']
+            ))
+
+    def make_value(self, size):
+        # Повторяющаяся разметка сжимается так же, как настоящие страницы.
+        chunk = '<article><p>Текст поста</p></article>\n'
+        return (chunk * (size // len(chunk) + 1))[:size]
+
+    def measure(self, cache, operations, value):
+        keys = [f'key:{number}' for number in range(operations)]
+        cache.set('counter', 0)
+        steps = (
+            ('set', lambda: [cache.set(key, value) for key in keys]),
+            ('get', lambda: [cache.get(key) for key in keys]),
+            ('get_many', lambda: [
+                cache.get_many(keys[start:start + BATCH_SIZE])
+                for start in range(0, operations, BATCH_SIZE)
+            ]),
+            ('incr', lambda: [cache.incr('counter') for _ in keys]),
+        )
+        for operation, run in steps:
+            started = time.perf_counter()
+            run()
+            yield operation, time.perf_counter() - started
+
+    def measure_processes(self, path, operations, processes):
+        cache = sqlite_cache(path)
+        cache.set('counter', 0)
+        per_process = operations // processes
+        started = time.perf_counter()
+        with Pool(processes) as pool:
+            pool.starmap(increment, [(path, per_process)] * processes)
+        seconds = time.perf_counter() - started
+        total = per_process * processes
+        return (
+            f'incr из {processes} процессов: {total / seconds:.0f} оп/с, '
+            f'счётчик {cache.get("counter")} из {total}'
+        )
@@ -0,0 +1,139 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import COMPRESSED, SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        cache = SQLiteCache(self.path, {'OPTIONS': options})
+        cache.ACCESS_RESOLUTION = 0
+        return cache
+
+    def tick(self):
+        """Подменяет часы, чтобы порядок обращений был однозначным."""
+        clock = itertools.count(1_000_000)
+        patcher = mock.patch(
+            'core.cache_backends.time.time',
+            side_effect=lambda: next(clock),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_totals_follow_overwrites(self):
+        self.cache.set('key', 'short')
+        self.cache.set('key', 'longer value')
+        self.cache.set('other', 1)
+        self.cache.delete('other')
+        totals = self.cache._db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        size = self.cache._db.execute('SELECT size FROM cache').fetchone()
+        self.assertEqual(totals, (1, size[0]))
+
+    def test_expired_value_is_missing(self):
+        self.cache.set('key', 'value', 0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertNotIn('key', self.cache)
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 'two'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'two'}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_large_values_are_compressed(self):
+        value = '<p>Текст поста</p>' * 500
+        self.cache.set('page', value)
+        kind, size = self.cache._db.execute(
+            'SELECT kind, size FROM cache'
+        ).fetchone()
+        self.assertEqual(kind, COMPRESSED)
+        self.assertLess(size, len(value))
+        self.assertEqual(self.cache.get('page'), value)
+
+    def test_incr(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+
+    def test_incr_from_many_connections_is_atomic(self):
+        self.cache.set('counter', 0)
+        other = self.make_cache()
+
+        def increment():
+            for _ in range(50):
+                other.incr('counter')
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_instances_share_file(self):
+        self.make_cache().set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_least_recently_read_keys_are_evicted(self):
+        self.tick()
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        cache.get('a')
+        cache.set('d', 4)
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'c', 'd']), {'a': 1, 'd': 4}
+        )
+
+    def test_size_limit_evicts_oldest_values(self):
+        self.tick()
+        cache = self.make_cache(
+            MAX_SIZE=1000, CULL_FREQUENCY=3, COMPRESS_MIN_SIZE=None
+        )
+        for key in 'abcd':
+            cache.set(key, 'x' * 300)
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c', 'd'])),
+                         ['c', 'd'])
+        entries, size = cache._db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        self.assertEqual(entries, 2)
+        self.assertLessEqual(size, 1000)
+
+    def test_size_pass_sees_entries_evicted_before_it(self):
+        self.tick()
+        cache = self.make_cache(
+            MAX_ENTRIES=3, MAX_SIZE=1000, CULL_FREQUENCY=3,
+            COMPRESS_MIN_SIZE=None,
+        )
+        cache.set_many({'a': 'x' * 300, 'b': 'x' * 300, 'c': 'x' * 300})
+        cache.set('d', 'x' * 300)
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c', 'd'])),
+                         ['c', 'd'])
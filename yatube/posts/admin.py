@@ -2,7 +2,14 @@ from django.contrib import admin
 from .models import Post, Group, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+class CachedQuerysetAdmin(admin.ModelAdmin):
+    """Списки и формы админки читают выборки через кеш запросов."""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).cached()
+
+
+class PostAdmin(CachedQuerysetAdmin):
     list_display = (
         'pk',
         'text',
@@ -17,6 +24,6 @@ class PostAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, CachedQuerysetAdmin)
+admin.site.register(Comment, CachedQuerysetAdmin)
+admin.site.register(Follow, CachedQuerysetAdmin)
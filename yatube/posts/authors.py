@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User
+
+# Карточка сбрасывается сигналами, срок только чистит забытые.
+AUTHOR_CARD_TIMEOUT = 60 * 60 * 24
+
+AuthorCard = namedtuple(
+    'AuthorCard', ('id', 'username', 'posts_count', 'followers_count')
+)
+
+
+def author_card_key(user_id):
+    return f'author_card:{user_id}'
+
+
+def get_author_cards(user_ids):
+    """Карточки авторов по id: одно чтение кеша и один запрос на промахи.
+
+    Пользователи без карточки в результат не попадают.
+    """
+    user_ids = set(user_ids)
+    cached = cache.get_many([author_card_key(pk) for pk in user_ids])
+    cards = {card.id: card for card in cached.values()}
+    missing = user_ids - cards.keys()
+    if missing:
+        loaded = {
+            pk: AuthorCard(pk, username, posts or 0, followers or 0)
+            for pk, username, posts, followers in User.objects.filter(
+                pk__in=missing
+            ).values_list(
+                'pk', 'username', 'stats__posts_count',
+                'stats__followers_count',
+            )
+        }
+        cache.set_many(
+            {author_card_key(pk): card for pk, card in loaded.items()},
+            AUTHOR_CARD_TIMEOUT,
+        )
+        cards.update(loaded)
+    return cards
+
+
+def get_author_card(user_id):
+    return get_author_cards([user_id]).get(user_id)
+
+
+def forget_author_cards(*user_ids):
+    """Сбрасывает карточки сразу и ещё раз после коммита."""
+    keys = [author_card_key(pk) for pk in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
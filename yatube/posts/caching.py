@@ -0,0 +1,296 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# Версии меняются при каждой записи, поэтому страницы можно хранить
+# без срока годности: устаревшая версия просто перестаёт читаться.
+PAGE_CACHE_TIMEOUT = None
+SITE_SCOPE = 'site'
+
+# Кеш процесса перед общим кешем; срок только ограничивает память.
+local_cache = caches['local']
+LOCAL_PAGE_TIMEOUT = 60
+# Сколько страницу может пересобирать один запрос, пока другие
+# получают прежнюю или ждут.
+PAGE_LOCK_TIMEOUT = 30
+MISS_WAIT = 2
+MISS_POLL_INTERVAL = 0.05
+
+OUTCOMES = ('not-modified', 'hit-local', 'hit', 'stale', 'miss')
+METRICS_FLUSH_INTERVAL = 10
+page_metrics = Counter()
+metrics_flushed_at = time.monotonic()
+metrics_lock = threading.Lock()
+
+
+def version_key(scope):
+    return f'version:{scope}'
+
+
+def modified_key(scope):
+    return f'modified:{scope}'
+
+
+def modified_now():
+    # Округляем вверх до секунды, как в заголовке Last-Modified.
+    return int(time.time()) + 1
+
+
+def load_counters(initial):
+    """Значения ключей из кеша; недостающие заводятся из initial."""
+    values = cache.get_many(list(initial))
+    for key, value in initial.items():
+        if key not in values:
+            cache.add(key, value, None)
+            values[key] = cache.get(key, value)
+    return values
+
+
+def get_versions(scopes):
+    """Возвращает текущие версии областей в том же порядке."""
+    # Начинаем с текущего времени в наносекундах, чтобы после
+    # вытеснения счётчика не вернуться к уже занятой версии.
+    keys = [version_key(scope) for scope in scopes]
+    versions = load_counters(dict.fromkeys(keys, time.time_ns()))
+    return [versions[key] for key in keys]
+
+
+def get_validators(scopes):
+    """Версии областей и время последнего изменения любой из них.
+
+    Оба значения приходят одним обращением к кешу. Время неизвестного
+    изменения считается текущим, чтобы не ответить 304 по ошибке.
+    """
+    version_keys = [version_key(scope) for scope in scopes]
+    modified_keys = [modified_key(scope) for scope in scopes]
+    values = load_counters({
+        **dict.fromkeys(version_keys, time.time_ns()),
+        **dict.fromkeys(modified_keys, modified_now()),
+    })
+    versions = [values[key] for key in version_keys]
+    return versions, max(values[key] for key in modified_keys)
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    # Время изменения округлено вверх до секунды, как в Last-Modified,
+    # и назад не отступает. Записи одной секунды получают одно время;
+    # пока она не прошла, Last-Modified не отдаётся (см.
+    # versioned_cache_page), и изменения внутри неё различает ETag.
+    keys = [modified_key(scope) for scope in scopes]
+    previous = cache.get_many(keys)
+    now = modified_now()
+    cache.set_many(
+        {key: max(previous.get(key, 0), now) for key in keys}, None
+    )
+
+
+def invalidate(*scopes):
+    """Сбрасывает закешированные страницы областей.
+
+    Версии поднимаются сразу и ещё раз после коммита: вторая смена
+    отсекает страницы, собранные другим запросом по старым данным
+    между первой сменой и фиксацией транзакции.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def page_cache_key(path):
+    return 'page:' + hashlib.md5(path.encode()).hexdigest()
+
+
+def get_post_author_id(post_id):
+    """Автор поста не меняется, поэтому соответствие кешируется."""
+    key = f'post_author:{post_id}'
+    author_id = cache.get(key)
+    if author_id is None:
+        from .models import Post
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return author_id
+
+
+def record(outcome):
+    with metrics_lock:
+        page_metrics[outcome] += 1
+        due = (time.monotonic() - metrics_flushed_at
+               >= METRICS_FLUSH_INTERVAL)
+    if due:
+        flush_metrics()
+
+
+def flush_metrics():
+    """Переносит счётчики процесса в общий кеш."""
+    global page_metrics, metrics_flushed_at
+    with metrics_lock:
+        counts, page_metrics = page_metrics, Counter()
+        metrics_flushed_at = time.monotonic()
+    for outcome, count in counts.items():
+        key = f'metrics:page:{outcome}'
+        if not cache.add(key, count, None):
+            cache.incr(key, count)
+
+
+def get_page_metrics():
+    """Счётчики всех процессов с учётом ещё не перенесённых."""
+    flush_metrics()
+    keys = {f'metrics:page:{outcome}': outcome for outcome in OUTCOMES}
+    values = cache.get_many(keys)
+    return {outcome: values.get(key, 0) for key, outcome in keys.items()}
+
+
+def respond(entry, outcome):
+    record(outcome)
+    _, content, content_type = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Cache'] = outcome
+    return response
+
+
+def wait_for_page(key, versions):
+    """Ждёт, пока страницу соберёт запрос, взявший блокировку."""
+    deadline = time.monotonic() + MISS_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(MISS_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == versions:
+            return entry
+    return None
+
+
+def render_page(request, key, versions, view, args, kwargs):
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200 and not response.streaming:
+        entry = (versions, response.content, response['Content-Type'])
+        cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+        local_cache.set(key, entry, LOCAL_PAGE_TIMEOUT)
+    record('miss')
+    response['X-Cache'] = 'miss'
+    return response
+
+
+def serve_page(request, key, versions, view, args, kwargs):
+    stale = local_cache.get(key)
+    if stale is not None and stale[0] == versions:
+        return respond(stale, 'hit-local')
+    entry = cache.get(key)
+    if entry is not None:
+        if entry[0] == versions:
+            local_cache.set(key, entry, LOCAL_PAGE_TIMEOUT)
+            return respond(entry, 'hit')
+        stale = entry
+
+    lock = f'lock:{key}'
+    if cache.add(lock, 1, PAGE_LOCK_TIMEOUT):
+        try:
+            return render_page(request, key, versions, view, args, kwargs)
+        finally:
+            cache.delete(lock)
+    if stale is not None:
+        return respond(stale, 'stale')
+    entry = wait_for_page(key, versions)
+    if entry is not None:
+        return respond(entry, 'hit')
+    return render_page(request, key, versions, view, args, kwargs)
+
+
+def serve_personal_page(request, key, versions, view, args, kwargs):
+    request.punch_holes = True
+    response = serve_page(
+        request, f'{key}:holes', versions, view, args, kwargs
+    )
+    if response.status_code == 200 and not response.streaming:
+        from .holes import fill_holes
+        response.content = fill_holes(request, response.content)
+    return response
+
+
+def page_etag(request, key, versions):
+    parts = [key, *map(str, versions)]
+    if request.user.is_authenticated:
+        # Вставленные фрагменты зависят от посетителя и его токена CSRF.
+        parts += [
+            str(request.user.pk),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ]
+    return '"{}"'.format(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def versioned_cache_page(get_scopes):
+    """Кеширует страницу под версиями её областей.
+
+    get_scopes получает аргументы представления и возвращает области,
+    от которых зависит страница; общая область сайта добавляется всегда.
+
+    Страница хранится по адресу вместе с версиями, под которыми
+    собрана, сначала в кеше процесса, затем в общем. Если версии
+    устарели, страницу пересобирает один запрос, взявший блокировку,
+    а остальные тем временем получают прежнюю. Когда прежней нет,
+    они недолго ждут готовую и только потом собирают сами.
+
+    Для вошедших пользователей хранится отдельное общее для всех тело,
+    собранное с метками на месте тегов hole; фрагменты посетителя
+    подставляются в него при каждом ответе.
+
+    ETag и Last-Modified считаются по тем же версиям до обращения
+    к кешу страниц, так что повторный запрос с совпавшим валидатором
+    получает 304 без сборки и без чтения тела.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = [SITE_SCOPE, *get_scopes(*args, **kwargs)]
+            versions, last_modified = get_validators(scopes)
+            if last_modified > time.time():
+                # Секунда изменения ещё идёт: в неё могут попасть новые
+                # записи с тем же Last-Modified. Хватит ETag.
+                last_modified = None
+            key = page_cache_key(request.get_full_path())
+            personal = request.user.is_authenticated
+            if personal:
+                # Токен во фрагментах меняется без смены версий,
+                # поэтому личные страницы проверяются только по ETag.
+                last_modified = None
+                serve = serve_personal_page
+            else:
+                serve = serve_page
+            etag = page_etag(request, key, versions)
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = serve(request, key, versions, view, args, kwargs)
+            else:
+                record('not-modified')
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(
+                    response, no_cache=True,
+                    **{'private' if personal else 'public': True}
+                )
+            return response
+        return wrapper
+    return decorator
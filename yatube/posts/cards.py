@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .authors import get_author_cards
+from .caching import SITE_SCOPE, get_versions
+from .thumbnails import prefetch_thumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+# Ключ меняется вместе с версией поста, старые карточки просто истекают.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(post, site_version):
+    return f'post_card:{post.pk}:{post.version}:{site_version}'
+
+
+def render_post_cards(posts):
+    """Возвращает HTML карточек постов, беря готовые из кеша.
+
+    Все карточки страницы читаются одним get_many, отрисовываются
+    только отсутствующие; их авторы и миниатюры приходят одной пачкой.
+    """
+    posts = list(posts)
+    site_version, = get_versions([SITE_SCOPE])
+    keys = [card_key(post, site_version) for post in posts]
+    cached = cache.get_many(keys)
+
+    missing = [post for post, key in zip(posts, keys) if key not in cached]
+    authors = get_author_cards(post.author_id for post in missing)
+
+    cards = []
+    rendered = {}
+    with prefetch_thumbnails(post.image for post in missing):
+        for post, key in zip(posts, keys):
+            card = cached.get(key)
+            if card is None:
+                card = render_to_string(
+                    CARD_TEMPLATE,
+                    {'post': post, 'author': authors[post.author_id]},
+                )
+                rendered[key] = card
+            cards.append(mark_safe(card))
+
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .authors import forget_author_cards
+from .models import AuthorStats, Group, Post
+from .querycache import table_changed
+
+# Оценка числа записей для навигации по номерам страниц.
+ESTIMATE_TIMEOUT = 60
+
+
+def shifted(deltas):
+    """Выражения UPDATE для сдвига счётчиков, не уходящие ниже нуля."""
+    return {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
+def change_author_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя одним UPDATE.
+
+    Недостающая строка создаётся только при увеличении: уменьшение
+    приходит и при каскадном удалении самого пользователя.
+    """
+    with transaction.atomic():
+        updated = AuthorStats.objects.filter(user_id=user_id).update(
+            **shifted(deltas)
+        )
+        if not updated and all(delta >= 0 for delta in deltas.values()):
+            _, created = AuthorStats.objects.get_or_create(
+                user_id=user_id, defaults=deltas
+            )
+            if not created:
+                AuthorStats.objects.filter(user_id=user_id).update(
+                    **shifted(deltas)
+                )
+    table_changed(AuthorStats)
+    forget_author_cards(user_id)
+
+
+def change_group_posts(group_id, delta):
+    if group_id:
+        Group.objects.filter(pk=group_id).update(
+            **shifted({'posts_count': delta})
+        )
+        table_changed(Group)
+
+
+def get_group_posts_count(group_id):
+    """Число постов группы прямо из её строки, а не из кеша имён."""
+    return Group.objects.filter(pk=group_id).values_list(
+        'posts_count', flat=True
+    ).first() or 0
+
+
+def change_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        **shifted({'comments_count': delta})
+    )
+    table_changed(Post)
+
+
+def get_author_stats(user):
+    """Счётчики пользователя; строка создаётся, если её ещё нет."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(user=user)
+        return stats
+
+
+def estimate_count(key, queryset):
+    """Число записей, подсчитанное не чаще раза в ESTIMATE_TIMEOUT."""
+    key = f'count_estimate:{key}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, ESTIMATE_TIMEOUT)
+    return count
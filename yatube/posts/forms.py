@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from .identity import get_group_choices
+from .images import ingest_image
 from .models import Post, Comment
 
 
@@ -9,6 +14,25 @@ class PostForm(ModelForm):
         fields = ('text', 'group', 'image')
         help_texts = {'text': 'Введите описание', 'group': 'Укажите группу'}
 
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Список групп берётся из кеша, а не запросом при каждом выводе.
+        group = self.fields['group']
+        group.choices = [('', group.empty_label), *get_group_choices()]
+        # Поля, файлы которых отброшены при загрузке из-за размера.
+        self.oversized = oversized
+
+    def clean_image(self):
+        if 'image' in self.oversized:
+            limit = settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)
+            raise ValidationError(
+                f'Картинка больше {limit} МБ.', code='file_too_large'
+            )
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return ingest_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
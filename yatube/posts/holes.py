@@ -0,0 +1,58 @@
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .follow_graph import get_follow_graph
+from .forms import CommentForm
+
+# Пользовательский текст экранируется шаблонами, поэтому подделать
+# такой комментарий в теле страницы нельзя.
+HOLE_PATTERN = re.compile(rb'<!--hole:([\w-]+)-->')
+
+
+def get_following_ids(user):
+    """Id авторов, на которых подписан пользователь."""
+    if not user.is_authenticated:
+        return set()
+    return get_follow_graph().following(user.pk)
+
+
+def viewer_context(request):
+    """Небольшой контекст посетителя, общий для всех дыр страницы."""
+    return {
+        'following_ids': SimpleLazyObject(
+            lambda: get_following_ids(request.user)
+        ),
+        'comment_form': CommentForm(),
+    }
+
+
+def render_hole(request, template_name, kwargs, viewer=None):
+    """Фрагмент видит только свои аргументы и контекст посетителя."""
+    if viewer is None:
+        viewer = viewer_context(request)
+    return render_to_string(template_name, {**viewer, **kwargs}, request)
+
+
+def hole_marker(template_name, kwargs):
+    payload = json.dumps([template_name, kwargs])
+    return f'<!--hole:{urlsafe_base64_encode(force_bytes(payload))}-->'
+
+
+def fill_holes(request, content):
+    """Заменяет метки в общем теле страницы фрагментами посетителя."""
+    viewer = viewer_context(request)
+
+    def fill(match):
+        template_name, kwargs = json.loads(
+            force_str(urlsafe_base64_decode(force_str(match.group(1))))
+        )
+        return force_bytes(
+            render_hole(request, template_name, kwargs, viewer)
+        )
+
+    return HOLE_PATTERN.sub(fill, content)
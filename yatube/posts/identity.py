@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.http import Http404
+
+from .caching import get_versions, local_cache
+from .models import Group, User
+
+# Записи живут, пока не сменится версия пространства имён; в кеше
+# процесса срок только ограничивает память.
+IDENTITY_TIMEOUT = None
+LOCAL_IDENTITY_TIMEOUT = 60
+
+USERS = 'identity:user'
+GROUPS = 'identity:group'
+# Поля группы, которые меняются только её сохранением.
+GROUP_FIELDS = ('pk', 'slug', 'title', 'description')
+
+
+def resolve(namespace, key, load):
+    """Значение из кеша процесса, общего кеша или load().
+
+    Версия пространства имён читается из общего кеша на каждый вызов,
+    поэтому смена версии сбрасывает записи во всех процессах сразу.
+    Отсутствие объекта кешируется так же, как и сам объект.
+    """
+    version, = get_versions([namespace])
+    cache_key = f'{namespace}:{version}:{key}'
+    entry = local_cache.get(cache_key)
+    if entry is None:
+        entry = cache.get(cache_key)
+        if entry is None:
+            entry = (load(),)
+            cache.set(cache_key, entry, IDENTITY_TIMEOUT)
+        local_cache.set(cache_key, entry, LOCAL_IDENTITY_TIMEOUT)
+    return entry[0]
+
+
+def get_user_id(username):
+    def load():
+        return User.objects.filter(username=username).values_list(
+            'pk', flat=True
+        ).first()
+    return resolve(USERS, f'username:{username}', load)
+
+
+def get_user_id_or_404(username):
+    user_id = get_user_id(username)
+    if user_id is None:
+        raise Http404(f'Пользователь {username} не найден')
+    return user_id
+
+
+def get_group(slug):
+    """Группа по адресу без счётчика постов.
+
+    Счётчик меняется с каждым постом и в кеш имён не попадает, его
+    читает counters.get_group_posts_count.
+    """
+    def load():
+        return Group.objects.only(*GROUP_FIELDS).filter(slug=slug).first()
+    return resolve(GROUPS, f'slug:{slug}', load)
+
+
+def get_group_or_404(slug):
+    group = get_group(slug)
+    if group is None:
+        raise Http404(f'Группа {slug} не найдена')
+    return group
+
+
+def get_group_choices():
+    """Пары (id, название) для выбора группы в форме поста."""
+    def load():
+        return [(group.pk, str(group)) for group in Group.objects.all()]
+    return resolve(GROUPS, 'choices', load)
@@ -0,0 +1,127 @@
+"""Приём картинок постов и их описание.
+
+Загрузки пишутся на диск кусками: BoundedUploadHandler стоит перед
+TemporaryFileUploadHandler и бросает файл, как только тот превысит
+IMAGE_UPLOAD_MAX_SIZE, так что ни память, ни временный каталог не
+растут дальше предела. ingest_image проверяет размеры по заголовку,
+не декодируя картинку, уменьшает слишком большие и пересохраняет
+их в JPEG или PNG.
+"""
+import os
+from hashlib import sha256
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, ImageOps
+
+# Поля поста с описанием картинки, см. describe_image.
+IMAGE_FIELDS = ('image_width', 'image_height', 'image_color', 'image_hash')
+# Для среднего цвета хватает грубого декодирования JPEG.
+DRAFT_SIZE = (64, 64)
+
+# Форматы, которые хранятся как есть, если картинку не пришлось менять.
+KEPT_FORMATS = {'JPEG': '.jpg', 'PNG': '.png'}
+JPEG_QUALITY = 85
+EXIF_ORIENTATION = 0x0112
+
+
+class BoundedUploadHandler(FileUploadHandler):
+    """Бросает загружаемый файл, превысивший IMAGE_UPLOAD_MAX_SIZE.
+
+    Имена брошенных полей остаются в request.oversized_uploads, чтобы
+    форма могла сказать, почему файла нет.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            if not hasattr(self.request, 'oversized_uploads'):
+                self.request.oversized_uploads = set()
+            self.request.oversized_uploads.add(self.field_name)
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def oversized_uploads(request):
+    return getattr(request, 'oversized_uploads', set())
+
+
+def ingest_image(file):
+    """Проверенная и приведённая к норме картинка из загрузки.
+
+    Размеры берутся из заголовка до декодирования: картинка больше
+    IMAGE_MAX_PIXELS отклоняется. Картинка больше IMAGE_MAX_SIDE по
+    длинной стороне, повёрнутая через EXIF или в другом формате
+    пересохраняется; остальные возвращаются без изменений.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Картинка {width}x{height} слишком большая.',
+                code='too_many_pixels',
+            )
+        max_side = settings.IMAGE_MAX_SIDE
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if (image.format in KEPT_FORMATS and not rotated
+                and max(width, height) <= max_side):
+            file.seek(0)
+            return file
+        # JPEG сразу декодируется в уменьшенном виде.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image_format, options = 'PNG', {'optimize': True}
+            image = image.convert('RGBA')
+        else:
+            image_format, options = 'JPEG', {'quality': JPEG_QUALITY}
+            image = image.convert('RGB')
+        # Пересохранённая картинка не больше IMAGE_MAX_SIDE по стороне,
+        # её можно держать в памяти.
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+    name = os.path.splitext(file.name)[0] + KEPT_FORMATS[image_format]
+    size = buffer.tell()
+    buffer.seek(0)
+    return InMemoryUploadedFile(
+        buffer, 'image', name, Image.MIME[image_format], size, None
+    )
+
+
+def describe_image(file):
+    """Размеры, средний цвет и SHA-256 содержимого картинки."""
+    digest = sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image.draft('RGB', DRAFT_SIZE)
+        pixel = image.convert('RGB').resize((1, 1), Image.BOX)
+        red, green, blue = pixel.getpixel((0, 0))
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def fill_image_fields(post):
+    """Записывает в пост описание его картинки или очищает его."""
+    if post.image:
+        fields = describe_image(post.image)
+    else:
+        fields = dict.fromkeys(IMAGE_FIELDS, '')
+        fields.update(image_width=None, image_height=None)
+    for field, value in fields.items():
+        setattr(post, field, value)
@@ -0,0 +1,33 @@
+from django.shortcuts import get_object_or_404
+
+from .authors import get_author_card
+from .models import Comment, Post
+from .paginators import CursorPaginator
+
+COMMENT_COUNT = 20
+
+
+def get_comments_page(post_id, after=None):
+    """Страница комментариев поста от старых к новым по курсору."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('created', 'pk')
+    paginator = CursorPaginator(
+        comments, COMMENT_COUNT, date_field='created', descending=False
+    )
+    return paginator.get_cursor_page(after=after)
+
+
+def load_post_detail(post_id, comments_after=None):
+    """Собирает данные страницы поста за два запроса.
+
+    Первый запрос приносит пост вместе с группой, второй - первую
+    страницу комментариев вместе с их авторами, так что размер ответа
+    не зависит от их числа. Карточка автора обычно берётся из кеша.
+    """
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
+    return {
+        'post': post,
+        'author': get_author_card(post.author_id),
+        'comments': get_comments_page(post.pk, after=comments_after),
+    }
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.images import IMAGE_FIELDS, fill_image_fields
+from posts.models import Post
+from posts.utils import chunks
+
+# Pillow отказывается открывать картинку больше 2 * MAX_IMAGE_PIXELS
+# ошибкой, которая не наследует OSError и ValueError.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, средний цвет и хеш картинок постов, '
+        'сохранённых до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Сколько постов читать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(image_hash='')
+        filled = failed = 0
+        for chunk in chunks(posts, options['chunk_size']):
+            for post in chunk:
+                try:
+                    fill_image_fields(post)
+                except IMAGE_ERRORS as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                # Сохранение поднимает версию поста, и карточки
+                # с заливкой пересобираются.
+                post.save(update_fields=IMAGE_FIELDS)
+                filled += 1
+        self.stdout.write(
+            f'Описано картинок: {filled}, не удалось открыть: {failed}'
+        )
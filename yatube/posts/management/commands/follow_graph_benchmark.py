@@ -0,0 +1,75 @@
+import random
+import sys
+import time
+from array import array
+
+from django.core.management.base import BaseCommand
+
+from posts.follow_graph import TYPECODE, FollowGraph
+
+LOOKUPS = 100000
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит граф подписок из случайных рёбер и показывает его '
+        'размер в памяти и скорость запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--edges', type=int, default=1000000,
+            help='Сколько подписок сгенерировать.',
+        )
+        parser.add_argument(
+            '--users', type=int, default=100000,
+            help='Сколько пользователей в графе.',
+        )
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        pairs = sorted({
+            (random.randrange(options['users']),
+             random.randrange(options['users']))
+            for _ in range(options['edges'])
+        })
+        users = array(TYPECODE, (user_id for user_id, _ in pairs))
+        authors = array(TYPECODE, (author_id for _, author_id in pairs))
+
+        graph = FollowGraph()
+        started = time.perf_counter()
+        graph.build(users, authors)
+        self.stdout.write(
+            f'Рёбер: {len(pairs)}, пользователей: {options["users"]}'
+        )
+        self.stdout.write(
+            f'Сборка: {time.perf_counter() - started:.2f} с'
+        )
+        self.stdout.write(
+            f'Граф в массивах: {graph.nbytes / 2 ** 20:.1f} МБ'
+        )
+        self.stdout.write(
+            f'Те же пары множеством кортежей: '
+            f'{self.set_size(pairs) / 2 ** 20:.1f} МБ'
+        )
+
+        samples = random.sample(pairs, min(LOOKUPS, len(pairs)))
+        for name, query in (
+            ('follows', lambda pair: graph.follows(*pair)),
+            ('following', lambda pair: graph.following(pair[0])),
+            ('followers', lambda pair: graph.followers(pair[1])),
+            ('followers_count', lambda pair: graph.followers_count(pair[1])),
+        ):
+            started = time.perf_counter()
+            for pair in samples:
+                query(pair)
+            seconds = time.perf_counter() - started
+            self.stdout.write(
+                f'  {name:<16} {seconds / len(samples) * 1e6:>8.2f} мкс'
+            )
+
+    def set_size(self, pairs):
+        # Одно направление, как если бы граф держали в set((user, author)).
+        edges = set(pairs)
+        tuples = sum(sys.getsizeof(pair) for pair in edges)
+        return sys.getsizeof(edges) + tuples
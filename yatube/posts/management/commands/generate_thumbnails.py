@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails, make_pool
+
+
+def generate_inline(name):
+    try:
+        generate_thumbnails(name)
+    except Exception as error:
+        return error
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает миниатюры для картинок уже опубликованных постов. '
+        'Готовые миниатюры пропускаются, так что команду можно '
+        'прерывать и запускать снова.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help=(
+                'Сколько процессов собирают миниатюры; 0 - собирать '
+                'в этом процессе.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        started = time.monotonic()
+        done = failed = 0
+        for name, error in self.generate(names.iterator(), options['workers']):
+            if error is None:
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Картинок обработано: {done}, с ошибками: {failed}, '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+
+    def generate(self, names, workers):
+        """Пары (имя картинки, ошибка или None) по мере готовности."""
+        if not workers:
+            for name in names:
+                yield name, generate_inline(name)
+            return
+        with make_pool(workers) as pool:
+            futures = {
+                pool.submit(generate_thumbnails, name): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.exception()
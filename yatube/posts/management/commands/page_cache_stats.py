@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import get_page_metrics
+
+
+class Command(BaseCommand):
+    help = 'Выводит попадания, промахи и устаревшие ответы кеша страниц.'
+
+    def handle(self, *args, **options):
+        metrics = get_page_metrics()
+        total = sum(metrics.values())
+        for outcome, count in metrics.items():
+            share = count / total if total else 0
+            self.stdout.write(f'{outcome:<12} {count:>10} {share:>7.1%}')
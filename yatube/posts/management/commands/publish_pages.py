@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import AuthorStats, Group, Post
+from posts.publishing import enqueue, guest_client, publish, stale_urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает готовые страницы для гостей, области которых стоят '
+        'в очереди после изменения данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help=(
+                'Поставить в очередь главную, все группы, профили авторов '
+                'и посты, например при первой публикации.'
+            ),
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help=(
+                'Разбирать очередь снова через столько секунд, не '
+                'завершаясь. По умолчанию очередь разбирается один раз.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if settings.PUBLISH_ROOT is None:
+            raise CommandError('Публикация выключена: не задан PUBLISH_ROOT')
+        if options['all']:
+            enqueue(self.site_scopes())
+
+        client = guest_client()
+        while True:
+            self.publish_queue(client)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def site_scopes(self):
+        scopes = ['index']
+        scopes += [
+            f'group:{slug}'
+            for slug in Group.objects.values_list('slug', flat=True)
+        ]
+        usernames = AuthorStats.objects.filter(posts_count__gt=0).values_list(
+            'user__username', flat=True
+        )
+        scopes += [f'profile:{username}' for username in usernames]
+        scopes += [
+            f'post:{post_id}'
+            for post_id in Post.objects.values_list('pk', flat=True)
+        ]
+        return scopes
+
+    def publish_queue(self, client):
+        for url in stale_urls():
+            started = time.monotonic()
+            status = publish(url, client)
+            if status is None:
+                self.stdout.write(f'Пропущен адрес {url}')
+                continue
+            seconds = time.monotonic() - started
+            self.stdout.write(f'{status} {seconds * 1000:>9.1f} мс  {url}')
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.caching import SITE_SCOPE, invalidate
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+from posts.querycache import table_changed
+from posts.utils import chunks
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся на текущую запись."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и чинит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько записей проверять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fixed = {
+            'пользователей': self.reconcile_users(chunk_size),
+            'групп': self.reconcile_groups(chunk_size),
+            'постов': self.reconcile_posts(chunk_size),
+        }
+        for name, count in fixed.items():
+            self.stdout.write(f'Исправлено {name}: {count}')
+        if any(fixed.values()):
+            # Счётчики выводятся на страницах, закешированных по версиям.
+            invalidate(SITE_SCOPE)
+
+    def reconcile_users(self, chunk_size):
+        users = User.objects.annotate(
+            real_posts=count_of(Post, 'author'),
+            real_followers=count_of(Follow, 'author'),
+            real_following=count_of(Follow, 'user'),
+        )
+        fixed = 0
+        for chunk in chunks(users, chunk_size):
+            stats = AuthorStats.objects.in_bulk([user.pk for user in chunk])
+            with transaction.atomic():
+                for user in chunk:
+                    real = {
+                        'posts_count': user.real_posts,
+                        'followers_count': user.real_followers,
+                        'following_count': user.real_following,
+                    }
+                    current = stats.get(user.pk)
+                    if current is not None and all(
+                            getattr(current, field) == value
+                            for field, value in real.items()):
+                        continue
+                    AuthorStats.objects.update_or_create(
+                        user_id=user.pk, defaults=real
+                    )
+                    fixed += 1
+        return fixed
+
+    def reconcile_groups(self, chunk_size):
+        return self.reconcile_column(
+            Group.objects.annotate(real=count_of(Post, 'group')),
+            'posts_count',
+            chunk_size,
+        )
+
+    def reconcile_posts(self, chunk_size):
+        return self.reconcile_column(
+            Post.objects.annotate(real=count_of(Comment, 'post')),
+            'comments_count',
+            chunk_size,
+        )
+
+    def reconcile_column(self, queryset, field, chunk_size):
+        model = queryset.model
+        queryset = queryset.only('pk', field)
+        fixed = 0
+        for chunk in chunks(queryset, chunk_size):
+            with transaction.atomic():
+                for obj in chunk:
+                    if getattr(obj, field) != obj.real:
+                        model.objects.filter(pk=obj.pk).update(
+                            **{field: obj.real}
+                        )
+                        fixed += 1
+        if fixed:
+            table_changed(model)
+        return fixed
@@ -0,0 +1,189 @@
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group, Post
+from posts.paginators import CursorPaginator
+from posts.publishing import guest_client
+from posts.views import POST_COUNT
+
+# Запросу, начатому у самого конца бюджета, всё же даётся немного
+# времени: с нулевым тайм-аутом сокет не ждёт ответа вовсе.
+MIN_TIMEOUT = 0.5
+
+
+def listing_urls(url, queryset, pages):
+    """Адреса первых pages страниц ленты по курсорам."""
+    urls = [url]
+    paginator = CursorPaginator(queryset, POST_COUNT)
+    paginator.get_cursor_page()
+    while len(urls) < pages and paginator.next_cursor:
+        cursor = paginator.next_cursor
+        urls.append(f'{url}?after={cursor}')
+        paginator = CursorPaginator(queryset, POST_COUNT)
+        paginator.get_cursor_page(after=cursor)
+    return urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кеши после выкладки: открывает первые страницы '
+        'ленты, самые активные группы и профили и свежие посты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='Сколько страниц каждой ленты открыть.',
+        )
+        parser.add_argument(
+            '--groups', type=int, default=10,
+            help='Сколько групп с наибольшим числом постов открыть.',
+        )
+        parser.add_argument(
+            '--profiles', type=int, default=10,
+            help='Сколько профилей с наибольшим числом подписчиков открыть.',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=50,
+            help='Сколько последних постов открыть.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько адресов открывать одновременно.',
+        )
+        parser.add_argument(
+            '--budget', type=float, default=60,
+            help='Сколько секунд можно потратить; остальное пропускается.',
+        )
+        parser.add_argument(
+            '--base-url',
+            help=(
+                'Открывать адреса на работающем сервере, например '
+                'http://127.0.0.1:8000. Так прогреваются и кеши '
+                'процессов сервера. По умолчанию страницы собираются '
+                'в этом процессе и прогревают только общий кеш.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        urls = self.collect_urls(options)
+        if options['base_url']:
+            fetch = self.fetch_remote
+        else:
+            fetch = self.fetch_local
+            self.client = guest_client()
+        self.base_url = (options['base_url'] or '').rstrip('/')
+
+        started = time.monotonic()
+        deadline = started + options['budget']
+        self.deadline = deadline
+        results = self.run(urls, fetch, options['workers'], deadline)
+        for url, status, seconds in results:
+            self.stdout.write(f'{status} {seconds * 1000:>9.1f} мс  {url}')
+
+        errors = sum(1 for _, status, _ in results if status != 200)
+        self.stdout.write(
+            f'Открыто {len(results)} из {len(urls)} адресов за '
+            f'{time.monotonic() - started:.1f} с, ошибок: {errors}'
+        )
+
+    def collect_urls(self, options):
+        pages = options['pages']
+        urls = listing_urls(reverse('posts:index'), Post.objects.all(), pages)
+        groups = Group.objects.order_by('-posts_count')[:options['groups']]
+        for group in groups:
+            urls += listing_urls(
+                reverse('posts:group_posts', kwargs={'slug': group.slug}),
+                group.posts.all(),
+                pages,
+            )
+        authors = AuthorStats.objects.select_related('user').order_by(
+            '-followers_count'
+        )[:options['profiles']]
+        for stats in authors:
+            urls += listing_urls(
+                reverse(
+                    'posts:profile',
+                    kwargs={'username': stats.user.username},
+                ),
+                stats.user.posts.all(),
+                pages,
+            )
+        post_ids = Post.objects.values_list('pk', flat=True)[
+            :options['posts']
+        ]
+        urls += [
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+            for post_id in post_ids
+        ]
+        return urls
+
+    def run(self, urls, fetch, workers, deadline):
+        """Открывает адреса, пока не кончится время, в порядке важности."""
+        if workers <= 1:
+            results = []
+            for url in urls:
+                if time.monotonic() >= deadline:
+                    break
+                results.append(fetch(url))
+            return results
+
+        results = []
+        pending = set()
+        urls = iter(urls)
+        with ThreadPoolExecutor(workers) as pool:
+            while True:
+                while len(pending) < workers and time.monotonic() < deadline:
+                    url = next(urls, None)
+                    if url is None:
+                        break
+                    pending.add(pool.submit(self.fetch_in_thread, fetch, url))
+                if not pending:
+                    return results
+                done, pending = wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=FIRST_COMPLETED,
+                )
+                results += [future.result() for future in done]
+                if time.monotonic() >= deadline:
+                    # Начатые запросы дожидаемся, новые не запускаем.
+                    results += [future.result() for future in pending]
+                    return results
+
+    def fetch_in_thread(self, fetch, url):
+        try:
+            return fetch(url)
+        finally:
+            connections.close_all()
+
+    def fetch_local(self, url):
+        started = time.monotonic()
+        response = self.client.get(url)
+        return url, response.status_code, time.monotonic() - started
+
+    def fetch_remote(self, url):
+        """Открывает адрес на сервере, ожидая не дольше остатка бюджета."""
+        started = time.monotonic()
+        timeout = max(self.deadline - started, MIN_TIMEOUT)
+        try:
+            with urlopen(self.base_url + url, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        except socket.timeout:
+            status = 'timeout'
+        except URLError as error:
+            if isinstance(error.reason, socket.timeout):
+                status = 'timeout'
+            else:
+                status = error.reason
+        return url, status, time.monotonic() - started
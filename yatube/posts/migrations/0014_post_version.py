@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_auto_20261018_0240'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Растёт при каждом сохранении поста', verbose_name='Версия'),
+        ),
+    ]
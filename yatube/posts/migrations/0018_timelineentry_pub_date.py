@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def copy_pub_dates(apps, schema_editor):
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry.objects.update(
+        pub_date=models.Subquery(
+            Post.objects.filter(pk=models.OuterRef('post_id')).values(
+                'pub_date'
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='Дата публикации'),
+        ),
+        migrations.RunPython(copy_pub_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='Дата публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+    ]
@@ -2,19 +2,113 @@ from django.db import models
 from django.db.models import UniqueConstraint
 from django.contrib.auth import get_user_model
 
+from .querycache import CachedQuerySet
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class CountersModel(models.Model):
+    """Модель со счётчиками, которые меняются только UPDATE с F().
+
+    Обычное сохранение счётчики не пишет: иначе оно вернуло бы в базу
+    значение, прочитанное до чужих приращений.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Group(CountersModel):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число постов'
+    )
+
+    objects = CachedQuerySet.as_manager()
+    counter_fields = ('posts_count',)
 
     def __str__(self) -> str:
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(CachedQuerySet):
+    # Столбцы, которые выводятся в карточке поста на лентах.
+    LISTING_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'image_color',
+        'version',
+        'author',
+        'group',
+        'group__slug',
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._comment_preview = None
+
+    def for_listing(self):
+        """Посты для лент с группой; автор берётся из posts.authors."""
+        return self.select_related('group').only(
+            *self.LISTING_FIELDS
+        )
+
+    def for_detail(self):
+        """Пост вместе с группой; автор берётся из posts.authors."""
+        return self.select_related('group')
+
+    def with_comment_preview(self, size):
+        """Добавляет каждому посту comment_preview с size новыми комментариями.
+
+        Комментарии всех постов выборки приходят одним запросом.
+        """
+        clone = self._chain()
+        clone._comment_preview = size
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._comment_preview = self._comment_preview
+        return clone
+
+    def _extra_tables(self):
+        if self._comment_preview:
+            return {Comment._meta.db_table, User._meta.db_table}
+        return set()
+
+    def _fetch_uncached(self):
+        super()._fetch_uncached()
+        # Превью попадают в кеш выборки вместе с постами.
+        if (self._comment_preview
+                and self._iterable_class is models.query.ModelIterable):
+            attach_comment_previews(self._result_cache, self._comment_preview)
+
+
+def attach_comment_previews(posts, size):
+    previews = {post.pk: [] for post in posts}
+    for comment in Comment.objects.latest_per_post(previews, size):
+        previews[comment.post_id].append(comment)
+    for post in posts:
+        post.comment_preview = previews[post.pk]
+
+
+class Post(CountersModel):
     text = models.TextField(
         verbose_name='Описание',
         help_text='Введите текст поста'
@@ -44,12 +138,106 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Описание картинки заполняется при сохранении, см. posts.images.
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота картинки'
+    )
+    image_color = models.CharField(
+        max_length=7,
+        blank=True,
+        editable=False,
+        verbose_name='Средний цвет картинки',
+        help_text='Заливка места под картинкой, пока она грузится'
+    )
+    image_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='SHA-256 картинки'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия',
+        help_text='Растёт при каждом сохранении поста'
+    )
+
+    objects = PostQuerySet.as_manager()
+    counter_fields = ('comments_count',)
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
+
+
+class CommentQuerySet(CachedQuerySet):
+    def latest_per_post(self, post_ids, size):
+        """Последние size комментариев каждого поста одним запросом.
+
+        Комментарии нумеруются оконной функцией внутри своего поста,
+        имя автора приходит в поле author_username. Django 2.2 не умеет
+        фильтровать по окну, поэтому запрос написан вручную.
+        """
+        post_ids = list(post_ids)
+        if not post_ids:
+            return []
+        comments = self.model._meta.db_table
+        users = User._meta.db_table
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        sql = f'''
+            SELECT c.id, c.post_id, c.author_id, c.text, c.created,
+                   u.username AS author_username
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY post_id ORDER BY created DESC, id DESC
+                ) AS position
+                FROM {comments}
+                WHERE post_id IN ({placeholders})
+            ) ranked
+            JOIN {comments} c ON c.id = ranked.id
+            JOIN {users} u ON u.id = c.author_id
+            WHERE ranked.position <= %s
+            ORDER BY c.post_id, c.created, c.id
+        '''
+        return self.raw(sql, [*post_ids, size])
 
 
 class Comment(models.Model):
@@ -73,6 +261,16 @@ class Comment(models.Model):
         verbose_name='Дата публикации комментария'
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self) -> str:
         return f'{self.author.username} - {self.text[:15]}...'
 
@@ -91,6 +289,8 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    objects = CachedQuerySet.as_manager()
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -102,3 +302,66 @@ class Follow(models.Model):
     def __str__(self) -> str:
         return (f'Пользователь {self.user.username} '
                 f'подписан на автора {self.author.username}')
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Пост'
+    )
+    # Копия даты поста: лента листается по индексу своей таблицы,
+    # без сортировки всех постов читателя.
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                name='unique_timeline_entry',
+                fields=['user', 'post'],
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'Лента {self.user_id}: пост {self.post_id}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Число подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок'
+    )
+
+    def __str__(self) -> str:
+        return f'Счётчики пользователя {self.user_id}'
@@ -0,0 +1,216 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(obj, date_field='pub_date'):
+    """Упаковывает ключ (дата, id) записи в непрозрачный токен."""
+    value = f'{getattr(obj, date_field).isoformat()}|{obj.pk}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token):
+    """Возвращает ключ (дата, id) или None для испорченного токена."""
+    try:
+        date, pk = force_str(urlsafe_base64_decode(token)).split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return date, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    По умолчанию идёт от новых постов к старым по pub_date; для
+    комментариев задаются своё поле даты и прямой порядок. Если записи
+    листаются по другой таблице, её поля для условия и сортировки
+    задаются в key_lookups; курсор всё равно берётся из даты и id
+    выведенной записи.
+
+    Каждая страница - это один проход по индексу от курсора. Номера
+    страниц относительные: текущая страница первая, если перед ней
+    ничего нет, и вторая в остальных случаях, а num_pages учитывает
+    только наличие следующей страницы. Этого достаточно стандартному
+    Page, чтобы has_next() и has_previous() работали без подсчёта.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True, key_lookups=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.date_field = date_field
+        self.descending = descending
+        self.key_lookups = key_lookups or (date_field, 'pk')
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращает страницу после или перед токеном курсора.
+
+        Испорченный или отсутствующий токен даёт первую страницу.
+        """
+        if before:
+            key = decode_cursor(before)
+            if key is not None:
+                return self._page_before(key)
+        if after:
+            key = decode_cursor(after)
+            if key is not None:
+                return self._page_after(key)
+        return self._page_after(None)
+
+    def _ordering(self, forward):
+        sign = '-' if forward == self.descending else ''
+        date_lookup, pk_lookup = self.key_lookups
+        return f'{sign}{date_lookup}', f'{sign}{pk_lookup}'
+
+    def _beyond(self, key, forward):
+        """Условие на записи за курсором в заданном направлении."""
+        date, pk = key
+        date_lookup, pk_lookup = self.key_lookups
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (
+            Q(**{f'{date_lookup}__{lookup}': date})
+            | Q(**{date_lookup: date, f'{pk_lookup}__{lookup}': pk})
+        )
+
+    def _rows(self, key, forward):
+        """До per_page + 1 записей за курсором в заданном направлении."""
+        queryset = self.object_list
+        if key is not None:
+            queryset = queryset.filter(self._beyond(key, forward))
+        return list(
+            queryset.order_by(*self._ordering(forward))[:self.per_page + 1]
+        )
+
+    def _page_after(self, key):
+        rows = self._rows(key, forward=True)
+        has_next = len(rows) > self.per_page
+        return self._make_page(
+            rows[:self.per_page],
+            has_previous=key is not None,
+            has_next=has_next,
+        )
+
+    def _page_before(self, key):
+        rows = self._rows(key, forward=False)
+        has_previous = len(rows) > self.per_page
+        if not has_previous and len(rows) < self.per_page:
+            # Сверху появились новые записи или курсор старый:
+            # неполную первую страницу отдаём целиком.
+            return self._page_after(None)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._make_page(
+            rows, has_previous=has_previous, has_next=True
+        )
+
+    def _make_page(self, rows, has_previous, has_next):
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        if rows and has_next:
+            self.next_cursor = encode_cursor(rows[-1], self.date_field)
+        if rows and has_previous:
+            self.previous_cursor = encode_cursor(rows[0], self.date_field)
+        return Page(rows, number, self)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорный пагинатор по нескольким потокам записей сразу.
+
+    Каждый поток - свой CursorPaginator с тем же числом записей на
+    странице; страница собирается из их страниц за тем же курсором,
+    так что каждый поток по-прежнему читается одним проходом по
+    своему индексу. Запись, пришедшая из нескольких потоков,
+    выводится один раз.
+    """
+
+    def __init__(self, paginators, per_page):
+        first = paginators[0]
+        super().__init__(
+            [], per_page,
+            date_field=first.date_field, descending=first.descending,
+        )
+        self.paginators = paginators
+
+    def _rows(self, key, forward):
+        rows = {}
+        for paginator in self.paginators:
+            for row in paginator._rows(key, forward):
+                rows.setdefault(row.pk, row)
+        ordered = sorted(
+            rows.values(),
+            key=lambda row: (getattr(row, self.date_field), row.pk),
+            reverse=forward == self.descending,
+        )
+        return ordered[:self.per_page + 1]
+
+
+class CountedPaginator(Paginator):
+    """Постраничный вывод по номерам с дешёвым числом объектов.
+
+    Число берётся из счётчика или кешированной оценки: count может
+    быть числом или функцией без аргументов. Страница режется без
+    оглядки на число, поэтому неточная оценка не теряет записи,
+    а номер за пределами оценки даёт последнюю страницу без второго
+    подсчёта. Навигация выводит только окно соседних страниц.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+        self.page_window = []
+
+    @cached_property
+    def count(self):
+        if self._count is None:
+            return super().count
+        if callable(self._count):
+            return self._count()
+        return self._count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        self.page_window = list(self.get_elided_page_range(number))
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей с многоточиями на месте пропусков.
+
+        Повторяет одноимённый метод Paginator из Django 3.2.
+        """
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(
+                self.num_pages - on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
@@ -0,0 +1,238 @@
+"""Готовые страницы для гостей, которые веб-сервер отдаёт сам.
+
+Главная, группы, профили и посты записываются в PUBLISH_ROOT/pages
+файлами <адрес>/index.html. Фронтовый сервер отдаёт такой файл на
+запрос без cookie сессии и без строки запроса, а остальные запросы
+передаёт в Django.
+
+Изменение данных ставит затронутые области кеша в очередь
+PUBLISH_ROOT/queue, по файлу-метке на область, и сразу удаляет файлы
+страниц, адрес которых известен без запросов, так что сервер не
+отдаёт их устаревшими. Очередь разбирает команда publish_pages или
+вызов publish_stale() из фонового процесса: области раскрываются в
+адреса и пересобираются только эти страницы.
+"""
+import hashlib
+import os
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.db import transaction
+from django.core.handlers.base import BaseHandler
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils.encoding import iri_to_uri
+
+from .caching import SITE_SCOPE
+from .models import Post
+
+PAGE_FILE = 'index.html'
+
+
+def get_root():
+    return settings.PUBLISH_ROOT
+
+
+def pages_dir():
+    return os.path.join(get_root(), 'pages')
+
+
+def queue_dir():
+    return os.path.join(get_root(), 'queue')
+
+
+class GuestClient:
+    """Собирает страницы гостя в этом процессе, как их отдал бы сервер.
+
+    Запросы строятся с явным хостом и проходят через обработчик и
+    middleware Django, без тестового клиента и его сигналов. Обработчик
+    общий для потоков, как у WSGI-сервера.
+    """
+
+    def __init__(self, host):
+        self.factory = RequestFactory(HTTP_HOST=host, SERVER_NAME=host)
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+
+    def get(self, url):
+        return self.handler.get_response(self.factory.get(url))
+
+
+def guest_client():
+    return GuestClient(settings.RENDER_HOST)
+
+
+def page_path(url):
+    """Файл страницы адреса; None, если адрес нельзя публиковать.
+
+    Адреса с сегментами . и .. (например, профиль пользователя с
+    именем "..") не публикуются: их файл оказался бы вне своего
+    каталога или заменил бы чужую страницу.
+    """
+    # reverse() отдаёт адрес в процентной кодировке, а фронтовый
+    # сервер ищет файл по раскодированному пути.
+    segments = unquote(url).strip('/').split('/')
+    if any(segment in ('.', '..') or '\0' in segment
+           for segment in segments):
+        return None
+    root = os.path.normpath(pages_dir())
+    path = os.path.normpath(os.path.join(root, *segments, PAGE_FILE))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def published_urls():
+    """Адреса всех опубликованных страниц."""
+    root = pages_dir()
+    urls = []
+    for path, _, files in os.walk(root):
+        if PAGE_FILE in files:
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            urls.append(
+                '/' if relative == '.' else iri_to_uri(f'/{relative}/')
+            )
+    return urls
+
+
+def direct_urls(scope):
+    """Адрес, который выводит данные области и известен без запросов."""
+    kind, _, value = scope.partition(':')
+    if scope == 'index':
+        return [reverse('posts:index')]
+    if kind == 'post':
+        return [reverse('posts:post_detail', kwargs={'post_id': value})]
+    if kind == 'profile':
+        return [reverse('posts:profile', kwargs={'username': value})]
+    if kind == 'group':
+        return [reverse('posts:group_posts', kwargs={'slug': value})]
+    return []
+
+
+def scope_urls(scope):
+    """Публикуемые адреса, которые выводят данные области кеша.
+
+    Для всего сайта и автора адреса собираются обходом каталога и
+    запросом, поэтому вызывается только при разборе очереди.
+    """
+    kind, _, value = scope.partition(':')
+    if scope == SITE_SCOPE:
+        return published_urls()
+    if scope == 'index':
+        return [reverse('posts:index')]
+    if kind == 'post':
+        return [reverse('posts:post_detail', kwargs={'post_id': value})]
+    if kind == 'author':
+        # Карточка автора со счётчиками выводится на страницах его постов.
+        urls = (
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+            for post_id in Post.objects.filter(author_id=value).values_list(
+                'pk', flat=True
+            )
+        )
+        return [url for url in urls if is_published(url)]
+    return direct_urls(scope)
+
+
+def is_published(url):
+    path = page_path(url)
+    return path is not None and os.path.exists(path)
+
+
+def unpublish(url):
+    path = page_path(url)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def enqueue(scopes):
+    os.makedirs(queue_dir(), exist_ok=True)
+    for scope in scopes:
+        name = hashlib.md5(scope.encode()).hexdigest()
+        path = os.path.join(queue_dir(), name)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as marker:
+            marker.write(scope)
+        os.replace(temporary, path)
+
+
+def scopes_changed(scopes):
+    """Ставит области в очередь и снимает с публикации их страницы.
+
+    Сразу удаляются только страницы, адрес которых известен без
+    запросов; страницы всего сайта и автора находит и пересобирает
+    разбор очереди, так что запрос с записью не зависит от размера
+    сайта. Очередь пополняется сразу и ещё раз после коммита, как и
+    версии в posts.caching.invalidate: страница, пересобранная по
+    старым данным до фиксации транзакции, будет собрана снова.
+    """
+    if get_root() is None:
+        return
+    for scope in scopes:
+        for url in direct_urls(scope):
+            unpublish(url)
+    enqueue(scopes)
+    transaction.on_commit(lambda: enqueue(scopes))
+
+
+def publish(url, client):
+    """Записывает страницу гостя в файл; возвращает код ответа.
+
+    Страница, которая не отдаётся с кодом 200, снимается с публикации.
+    Адрес, который нельзя публиковать, пропускается, и возвращается None.
+    """
+    path = page_path(url)
+    if path is None:
+        return None
+    response = client.get(url)
+    if response.status_code != 200:
+        unpublish(url)
+        return response.status_code
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as page:
+        page.write(response.content)
+    os.replace(temporary, path)
+    return response.status_code
+
+
+def take_stale():
+    """Забирает области из очереди; метка удаляется до пересборки.
+
+    Если область изменится во время пересборки, её метка появится
+    снова. Несколько процессов могут разбирать очередь одновременно:
+    область достаётся тому, кто первым удалил метку.
+    """
+    try:
+        names = sorted(os.listdir(queue_dir()))
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(queue_dir(), name)
+        try:
+            with open(path, encoding='utf-8') as marker:
+                scope = marker.read()
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        yield scope
+
+
+def stale_urls():
+    """Адреса областей из очереди, каждый по одному разу."""
+    urls = {}
+    for scope in take_stale():
+        urls.update(dict.fromkeys(scope_urls(scope)))
+    return list(urls)
+
+
+def publish_stale(client=None):
+    """Пересобирает страницы из очереди; возвращает пары (адрес, код)."""
+    client = client or guest_client()
+    return [(url, publish(url, client)) for url in stale_urls()]
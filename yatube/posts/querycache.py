@@ -0,0 +1,141 @@
+import hashlib
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+
+from .caching import SITE_SCOPE, get_versions, invalidate
+
+QUERY_CACHE_TIMEOUT = 300
+
+# Модели, записи в которые поднимают поколение их таблицы. Запрос,
+# затрагивающий другие таблицы, кешироваться не будет.
+TRACKED_MODELS = (
+    'posts.Post',
+    'posts.Group',
+    'posts.Comment',
+    'posts.Follow',
+    'posts.AuthorStats',
+    settings.AUTH_USER_MODEL,
+)
+
+QUOTED_NAME = re.compile(r'"([^"]+)"')
+
+
+def table_scope(model):
+    return f'table:{model._meta.db_table}'
+
+
+def table_changed(model):
+    """Устаревают все закешированные выборки, читавшие таблицу модели.
+
+    Вызывается сигналами и после UPDATE в обход save().
+    """
+    invalidate(table_scope(model))
+
+
+@lru_cache(maxsize=None)
+def get_tracked_tables():
+    return frozenset(
+        apps.get_model(label)._meta.db_table for label in TRACKED_MODELS
+    )
+
+
+@lru_cache(maxsize=None)
+def get_known_tables():
+    return frozenset(model._meta.db_table for model in apps.get_models())
+
+
+class CachedQuerySet(models.QuerySet):
+    """QuerySet, умеющий брать результат из кеша по требованию.
+
+    cached() включает кеширование для выборки и её производных.
+    Ключ строится по SQL с параметрами и поколениям: по умолчанию это
+    поколения всех таблиц, упомянутых в запросе, а scopes позволяют
+    привязаться к областям из posts.caching, например к одной группе.
+    Любая запись в таблицу или область меняет ключ, поэтому результат
+    не переживает изменения данных.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_options = None
+
+    def cached(self, timeout=QUERY_CACHE_TIMEOUT, scopes=None):
+        clone = self._chain()
+        clone._cache_options = (timeout, scopes)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_options = self._cache_options
+        return clone
+
+    def _cache_key(self, kind):
+        """Ключ выборки или None, если её нельзя кешировать."""
+        if (self._cache_options is None or self._for_write
+                or self.query.select_for_update):
+            return None
+        _, scopes = self._cache_options
+        if scopes is None and self._prefetch_related_lookups:
+            # Связанные выборки читают таблицы, которых нет в SQL.
+            return None
+        try:
+            sql, params = self.query.chain().get_compiler(
+                self.db
+            ).as_sql()
+        except EmptyResultSet:
+            return None
+        if scopes is None:
+            used = set(QUOTED_NAME.findall(sql)) & get_known_tables()
+            used |= self._extra_tables()
+            if used - get_tracked_tables():
+                return None
+            scopes = [f'table:{table}' for table in sorted(used)]
+        else:
+            scopes = [SITE_SCOPE, *scopes]
+        query = repr((kind, self._iterable_class.__name__, sql, params))
+        versions = get_versions(scopes)
+        return 'query:{}:{}'.format(
+            hashlib.md5(query.encode()).hexdigest(),
+            '.'.join(map(str, versions)),
+        )
+
+    def _extra_tables(self):
+        """Таблицы, которые выборка читает помимо своего SQL."""
+        return set()
+
+    def _fetch_all(self):
+        if self._result_cache is not None:
+            return super()._fetch_all()
+        key = self._cache_key('rows')
+        if key is None:
+            return self._fetch_uncached()
+        results = cache.get(key)
+        if results is None:
+            self._fetch_uncached()
+            timeout, _ = self._cache_options
+            cache.set(key, self._result_cache, timeout)
+        else:
+            self._result_cache = results
+            self._prefetch_done = True
+
+    def _fetch_uncached(self):
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        key = self._cache_key('count')
+        if key is None:
+            return super().count()
+        count = cache.get(key)
+        if count is None:
+            count = super().count()
+            timeout, _ = self._cache_options
+            cache.set(key, count, timeout)
+        return count
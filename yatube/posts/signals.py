@@ -0,0 +1,194 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, publishing, thumbnails, timeline
+from .authors import forget_author_cards
+from .follow_graph import edge_changed
+from .images import fill_image_fields
+from .caching import SITE_SCOPE, invalidate
+from .identity import GROUPS, USERS
+from .querycache import TRACKED_MODELS, table_changed
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def pages_changed(*scopes):
+    # Кроме кеша страниц устаревают и готовые страницы для гостей.
+    invalidate(*scopes)
+    publishing.scopes_changed(scopes)
+
+
+def post_scopes(post):
+    scopes = [
+        'index',
+        f'post:{post.pk}',
+        f'author:{post.author_id}',
+        f'profile:{post.author.username}',
+    ]
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    old_group_id, old_group_slug = getattr(post, '_old_group', (None, None))
+    if old_group_id != post.group_id and old_group_slug:
+        scopes.append(f'group:{old_group_slug}')
+    return scopes
+
+
+def comment_scopes(comment):
+    # Последние комментарии видны и в карточках на лентах.
+    scopes = [f'post:{comment.post_id}']
+    author_username, group_slug = Post.objects.filter(
+        pk=comment.post_id
+    ).values_list('author__username', 'group__slug').first() or (None, None)
+    if author_username:
+        scopes += ['index', f'profile:{author_username}']
+    if group_slug:
+        scopes.append(f'group:{group_slug}')
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def post_pre_save(sender, instance, **kwargs):
+    if instance.pk:
+        # Пост мог переехать в другую группу: у старой надо поправить
+        # счётчик и сбросить страницы.
+        instance._old_group = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'group__slug').first() or (None, None)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_pre_save(sender, instance, **kwargs):
+    # Новая картинка ещё не записана в хранилище: описываем её сразу,
+    # чтобы шаблонам не пришлось открывать файл.
+    if not instance.image._committed or (
+            not instance.image and instance.image_hash):
+        fill_image_fields(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author_stats(instance.author_id, posts_count=1)
+        counters.change_group_posts(instance.group_id, 1)
+        timeline.fan_out(instance)
+    else:
+        old_group_id, _ = getattr(instance, '_old_group', (None, None))
+        if old_group_id != instance.group_id:
+            counters.change_group_posts(old_group_id, -1)
+            counters.change_group_posts(instance.group_id, 1)
+    cache.set(f'post_author:{instance.pk}', instance.author_id, None)
+    pages_changed(*post_scopes(instance))
+    if instance.image:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, posts_count=-1)
+    counters.change_group_posts(instance.group_id, -1)
+    cache.delete(f'post_author:{instance.pk}')
+    pages_changed(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post_comments(instance.post_id, 1)
+    pages_changed(*comment_scopes(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post_comments(instance.post_id, -1)
+    pages_changed(*comment_scopes(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название и адрес группы выводятся почти на каждой странице.
+    pages_changed(SITE_SCOPE, GROUPS, f'group:{instance.slug}')
+
+
+def follow_scopes(follow):
+    # Счётчик подписчиков выводится у автора, счётчик подписок - в
+    # профиле подписчика.
+    return (
+        f'profile:{follow.author.username}',
+        f'author:{follow.author_id}',
+        f'profile:{follow.user.username}',
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author_stats(instance.author_id, followers_count=1)
+        counters.change_author_stats(instance.user_id, following_count=1)
+        timeline.follow_changed(instance, created=True)
+    edge_changed(instance.user_id, instance.author_id)
+    pages_changed(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, followers_count=-1)
+    counters.change_author_stats(instance.user_id, following_count=-1)
+    timeline.follow_changed(instance, created=False)
+    edge_changed(instance.user_id, instance.author_id)
+    pages_changed(*follow_scopes(instance))
+
+
+@receiver(pre_save, sender=User)
+def user_pre_save(sender, instance, update_fields=None, **kwargs):
+    # При входе сохраняется только last_login, его пропускаем.
+    if not instance.pk or (
+            update_fields is not None and 'username' not in update_fields):
+        return
+    old_username = User.objects.filter(pk=instance.pk).values_list(
+        'username', flat=True
+    ).first()
+    instance._username_changed = old_username != instance.username
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+        invalidate(USERS)
+    if getattr(instance, '_username_changed', False):
+        pages_changed(SITE_SCOPE, USERS)
+        forget_author_cards(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate(USERS)
+    forget_author_cards(instance.pk)
+
+
+@receiver(post_save, sender=AuthorStats)
+@receiver(post_delete, sender=AuthorStats)
+def author_stats_changed(sender, instance, **kwargs):
+    # Счётчики сдвигаются и UPDATE в обход save(), см. counters.
+    forget_author_cards(instance.user_id)
+
+
+def tracked_model_changed(sender, update_fields=None, **kwargs):
+    # При входе сохраняется только last_login, выборки его не выводят.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    table_changed(sender)
+
+
+for label in TRACKED_MODELS:
+    model = apps.get_model(label)
+    post_save.connect(
+        tracked_model_changed, sender=model,
+        dispatch_uid=f'querycache_save_{label}',
+    )
+    post_delete.connect(
+        tracked_model_changed, sender=model,
+        dispatch_uid=f'querycache_delete_{label}',
+    )
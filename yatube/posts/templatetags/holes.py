@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.holes import hole_marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """Фрагмент, зависящий от посетителя.
+
+    При сборке общего тела страницы вместо него остаётся метка,
+    которую заполняет fill_holes, иначе он выводится сразу.
+    """
+    request = context['request']
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(hole_marker(template_name, kwargs))
+    return render_hole(request, template_name, kwargs)
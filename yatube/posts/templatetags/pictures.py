@@ -0,0 +1,47 @@
+from django import template
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts.thumbnails import (
+    FALLBACK_TYPE, FALLBACK_WIDTH, get_variants, variant_geometry
+)
+
+register = template.Library()
+
+# Карточка занимает всю ширину колонки, но не шире 960 точек.
+DEFAULT_SIZES = '(min-width: 992px) 960px, 100vw'
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def picture(image, sizes=DEFAULT_SIZES, color=''):
+    """Картинка поста с srcset в WebP и JPEG.
+
+    Размеры <img> известны заранее, а место под картинкой заливается
+    её средним цветом color, так что страница не прыгает при загрузке.
+    Ошибка сборки миниатюр, как и в теге {% thumbnail %}, не ломает
+    страницу: картинка просто не выводится.
+    """
+    if not image:
+        return {}
+    try:
+        variants = get_variants(image)
+    except Exception:
+        if thumbnail_settings.THUMBNAIL_DEBUG:
+            raise
+        return {}
+    fallback = variants.pop(FALLBACK_TYPE)
+    width, height = variant_geometry(FALLBACK_WIDTH).split('x')
+    return {
+        'sources': [
+            (mime_type, srcset(files)) for mime_type, files in variants.items()
+        ],
+        'srcset': srcset(fallback),
+        'src': dict(fallback)[FALLBACK_WIDTH],
+        'sizes': sizes,
+        'width': width,
+        'height': height,
+        'color': color,
+    }
+
+
+def srcset(files):
+    return ', '.join(f'{thumbnail.url} {width}w' for width, thumbnail in files)
@@ -0,0 +1,12 @@
+from django import template
+
+from posts.cards import render_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Пары (пост, HTML карточки) для вывода в цикле шаблона."""
+    posts = list(posts)
+    return list(zip(posts, render_post_cards(posts)))
@@ -0,0 +1,442 @@
+import socket
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+
+from posts import caching
+from posts.authors import get_author_card, get_author_cards
+from posts.caching import (
+    PAGE_LOCK_TIMEOUT, SITE_SCOPE, get_page_metrics, get_versions,
+    local_cache, page_cache_key
+)
+from posts.cards import card_key
+from posts.management.commands import warm_caches
+from posts.models import Post, Group, Comment, Follow
+
+
+User = get_user_model()
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create_user(username='cache_author')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Группа для кеша',
+            slug='cache_group',
+            description='Описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_cache_group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Закешированный пост',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_guest_page_is_cached(self):
+        first = PageCacheTest.guest_client.get(reverse('posts:index'))
+        second = PageCacheTest.guest_client.get(reverse('posts:index'))
+
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_authorized_page_is_cached_with_holes(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        PageCacheTest.authorized_client.get(url)
+        reader = User.objects.create_user(username='cache_reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+
+        # Только сессия и пользователь: тело страницы общее.
+        with self.assertNumQueries(2):
+            response = reader_client.get(url)
+
+        self.assertNotIn('post', response.context)
+        self.assertEqual(response['X-Cache'], 'hit-local')
+        self.assertContains(response, 'Пользователь: cache_reader')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, 'редактировать запись')
+        self.assertNotContains(response, '<!--hole:')
+
+        response = PageCacheTest.authorized_client.get(url)
+        self.assertContains(response, 'Пользователь: cache_author')
+        self.assertContains(response, 'редактировать запись')
+
+    def test_follow_button_follows_viewer(self):
+        url = reverse('posts:profile', kwargs={'username': 'cache_author'})
+        reader = User.objects.create_user(username='cache_follower')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.assertContains(reader_client.get(url), 'Подписаться')
+
+        reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'cache_author'}
+        ))
+        response = reader_client.get(url)
+
+        self.assertContains(response, 'Отписаться')
+
+    def test_guest_page_has_no_user_fragments(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        PageCacheTest.authorized_client.get(url)
+        response = PageCacheTest.guest_client.get(url)
+
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_new_post_invalidates_pages(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            PageCacheTest.guest_client.get(url)
+
+        Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group
+        )
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = PageCacheTest.guest_client.get(url)
+                self.assertIsNotNone(response.context)
+
+    def test_comment_invalidates_post_detail(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        PageCacheTest.guest_client.get(url)
+
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        response = PageCacheTest.guest_client.get(url)
+
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_group_change_invalidates_old_group(self):
+        post = Post.objects.create(
+            text='Переезжающий пост', author=self.user, group=self.group
+        )
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        PageCacheTest.guest_client.get(url)
+
+        post.group = self.other_group
+        post.save()
+        response = PageCacheTest.guest_client.get(url)
+
+        self.assertNotIn(post, response.context['page_obj'].object_list)
+
+    def test_follow_invalidates_follower_profile(self):
+        reader = User.objects.create_user(username='cache_reader')
+        url = reverse('posts:profile', kwargs={'username': 'cache_reader'})
+        self.assertContains(PageCacheTest.guest_client.get(url), 'подписок: 0')
+
+        follow = Follow.objects.create(user=reader, author=self.user)
+        self.assertContains(PageCacheTest.guest_client.get(url), 'подписок: 1')
+
+        follow.delete()
+        self.assertContains(PageCacheTest.guest_client.get(url), 'подписок: 0')
+
+    def test_page_tiers(self):
+        url = reverse('posts:index')
+        first = PageCacheTest.guest_client.get(url)
+        second = PageCacheTest.guest_client.get(url)
+        local_cache.clear()
+        third = PageCacheTest.guest_client.get(url)
+
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit-local')
+        self.assertEqual(third['X-Cache'], 'hit')
+
+    def test_stale_page_served_while_other_request_renders(self):
+        url = reverse('posts:index')
+        PageCacheTest.guest_client.get(url)
+        Post.objects.create(text='Пост после кеша', author=self.user)
+        lock = 'lock:' + page_cache_key(url)
+        cache.add(lock, 1, PAGE_LOCK_TIMEOUT)
+
+        stale = PageCacheTest.guest_client.get(url)
+        cache.delete(lock)
+        fresh = PageCacheTest.guest_client.get(url)
+
+        self.assertEqual(stale['X-Cache'], 'stale')
+        self.assertNotContains(stale, 'Пост после кеша')
+        self.assertEqual(fresh['X-Cache'], 'miss')
+        self.assertContains(fresh, 'Пост после кеша')
+
+    def test_metrics_count_outcomes(self):
+        url = reverse('posts:index')
+        before = get_page_metrics()
+        PageCacheTest.guest_client.get(url)
+        PageCacheTest.guest_client.get(url)
+        after = get_page_metrics()
+
+        self.assertEqual(after['miss'], before['miss'] + 1)
+        self.assertEqual(after['hit-local'], before['hit-local'] + 1)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create_user(username='etag_author')
+        cls.post = Post.objects.create(text='Пост с ETag', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_matching_etag_returns_not_modified(self):
+        url = reverse('posts:index')
+        etag = ConditionalGetTest.guest_client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = ConditionalGetTest.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_validators(self):
+        url = reverse('posts:profile', kwargs={'username': 'etag_author'})
+        first = ConditionalGetTest.guest_client.get(url)
+
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = ConditionalGetTest.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=first['ETag']
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def later(self, seconds=2):
+        return mock.patch.object(
+            caching.time, 'time', return_value=time.time() + seconds
+        )
+
+    def test_if_modified_since(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ConditionalGetTest.guest_client.get(url)
+
+        with self.later():
+            last_modified = ConditionalGetTest.guest_client.get(
+                url
+            )['Last-Modified']
+            response = ConditionalGetTest.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_is_sent_once_its_second_has_passed(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.post.text = 'Первая правка'
+        self.post.save()
+
+        self.assertNotIn(
+            'Last-Modified', ConditionalGetTest.guest_client.get(url)
+        )
+        with self.later():
+            last_modified = ConditionalGetTest.guest_client.get(
+                url
+            )['Last-Modified']
+            self.post.text = 'Вторая правка'
+            self.post.save()
+            response = ConditionalGetTest.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Вторая правка')
+
+    def test_bumps_do_not_run_ahead_of_the_clock(self):
+        for _ in range(50):
+            caching.bump('index')
+
+        _, last_modified = caching.get_validators(['index'])
+        self.assertLessEqual(last_modified, time.time() + 1)
+
+    def test_personal_pages_use_private_etag(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:index')
+        response = client.get(url)
+
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(
+            response['ETag'],
+            ConditionalGetTest.guest_client.get(url)['ETag'],
+        )
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Группа карточек',
+            slug='card_group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Пост с карточкой',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get_card_key(self, post):
+        site_version, = get_versions([SITE_SCOPE])
+        return card_key(post, site_version)
+
+    def test_card_is_shared_between_pages(self):
+        PostCardCacheTest.guest_client.get(reverse('posts:index'))
+        key = self.get_card_key(self.post)
+        self.assertIsNotNone(cache.get(key))
+
+        cache.set(key, '<article>Карточка из кеша</article>')
+        response = PostCardCacheTest.guest_client.get(
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        )
+
+        self.assertContains(response, 'Карточка из кеша')
+
+    def test_edit_changes_card_key(self):
+        post = Post.objects.create(text='Старый текст', author=self.user)
+        old_key = self.get_card_key(post)
+
+        post.text = 'Новый текст'
+        post.save()
+
+        self.assertNotEqual(self.get_card_key(post), old_key)
+        response = PostCardCacheTest.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+
+
+class WarmCachesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_client = Client()
+        cls.user = User.objects.create_user(username='warm_author')
+        cls.group = Group.objects.create(
+            title='Группа для прогрева',
+            slug='warm_group',
+            description='Описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.user, group=cls.group)
+            for number in range(12)
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        local_cache.clear()
+
+    def test_pages_are_served_from_cache_after_warming(self):
+        out = StringIO()
+        call_command('warm_caches', workers=1, pages=2, stdout=out)
+        local_cache.clear()
+
+        urls = [
+            line.split()[-1] for line in out.getvalue().splitlines()
+            if line.startswith('200 ')
+        ]
+        self.assertIn(reverse('posts:index'), urls)
+        self.assertIn(
+            reverse('posts:profile', kwargs={'username': 'warm_author'}),
+            urls,
+        )
+        next_page = [url for url in urls if '?after=' in url][0]
+        for url in (reverse('posts:index'), next_page):
+            with self.subTest(url=url):
+                response = WarmCachesTest.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'hit')
+
+    def test_budget_stops_warming(self):
+        out = StringIO()
+        call_command('warm_caches', budget=0, stdout=out)
+
+        self.assertIn('Открыто 0 из', out.getvalue())
+        response = WarmCachesTest.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response['X-Cache'], 'miss')
+
+    def test_remote_fetch_times_out_within_budget(self):
+        out = StringIO()
+        with mock.patch.object(
+                warm_caches, 'urlopen',
+                side_effect=socket.timeout('timed out')) as urlopen:
+            call_command(
+                'warm_caches', workers=1, posts=0, budget=30,
+                base_url='http://127.0.0.1:8000', stdout=out,
+            )
+
+        timeout = urlopen.call_args.kwargs['timeout']
+        self.assertGreater(timeout, 0)
+        self.assertLessEqual(timeout, 30)
+        self.assertIn('timeout ', out.getvalue())
+
+
+class AuthorCardTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='card_author')
+        cls.reader = User.objects.create_user(username='card_reader')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_cards_are_fetched_in_one_query_and_cached(self):
+        user_ids = [self.author.pk, self.reader.pk]
+        with self.assertNumQueries(1):
+            cards = get_author_cards(user_ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_author_cards(user_ids), cards)
+
+        self.assertEqual(cards[self.author.pk].username, 'card_author')
+
+    def test_counters_and_rename_refresh_card(self):
+        get_author_card(self.author.pk)
+
+        Post.objects.create(text='Пост для карточки', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author.username = 'renamed_card_author'
+        self.author.save()
+
+        card = get_author_card(self.author.pk)
+        self.assertEqual(card.username, 'renamed_card_author')
+        self.assertEqual(card.posts_count, 1)
+        self.assertEqual(card.followers_count, 1)
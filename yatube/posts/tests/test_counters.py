@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted_author')
+        cls.reader = User.objects.create_user(username='counted_reader')
+        cls.group = Group.objects.create(
+            title='Группа со счётчиком',
+            slug='counted_group',
+            description='Описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа со счётчиком',
+            slug='other_counted_group',
+            description='Описание',
+        )
+
+    def get_stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        post.delete()
+        self.assertEqual(self.get_stats(self.author).posts_count, 0)
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_save_keeps_concurrent_increments(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        group = Group.objects.get(pk=self.group.pk)
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        Post.objects.create(
+            text='Ещё пост', author=self.author, group=self.group
+        )
+
+        post.text = 'Исправленный пост'
+        post.save()
+        group.title = 'Переименованная группа'
+        group.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+        group.refresh_from_db()
+        self.assertEqual(group.title, 'Переименованная группа')
+        self.assertEqual(group.posts_count, 2)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        self.assertEqual(self.get_stats(self.author).followers_count, 1)
+        self.assertEqual(self.get_stats(self.reader).following_count, 1)
+
+        follow.delete()
+        self.assertEqual(self.get_stats(self.author).followers_count, 0)
+        self.assertEqual(self.get_stats(self.reader).following_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(
+            posts_count=7, followers_count=0
+        )
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Group.objects.filter(pk=self.group.pk).update(posts_count=3)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+
+        author_stats = self.get_stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.get_stats(self.reader).following_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,92 @@
+from array import array
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.follow_graph import TYPECODE, FollowGraph, get_follow_graph
+from posts.models import Follow
+
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='graph_reader')
+        cls.author = User.objects.create_user(username='graph_author')
+        cls.other_author = User.objects.create_user(username='graph_other')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_graph_answers_both_directions(self):
+        graph = FollowGraph()
+        graph.sync()
+
+        self.assertTrue(graph.follows(self.reader.pk, self.author.pk))
+        self.assertFalse(graph.follows(self.author.pk, self.reader.pk))
+        self.assertEqual(graph.following(self.reader.pk), {self.author.pk})
+        self.assertEqual(graph.followers(self.author.pk), {self.reader.pk})
+        self.assertEqual(graph.following_count(self.reader.pk), 1)
+        self.assertEqual(graph.followers_count(self.other_author.pk), 0)
+
+    def test_other_process_replays_changes_from_journal(self):
+        graph = FollowGraph()
+        graph.sync()
+
+        Follow.objects.create(user=self.reader, author=self.other_author)
+        Follow.objects.filter(author=self.author).delete()
+        with self.assertNumQueries(1):
+            graph.sync()
+
+        self.assertEqual(
+            graph.following(self.reader.pk), {self.other_author.pk}
+        )
+        self.assertEqual(graph.followers_count(self.author.pk), 0)
+        self.assertEqual(graph.followers_count(self.other_author.pk), 1)
+
+    def test_compaction_keeps_answers(self):
+        graph = FollowGraph()
+        graph.build(array(TYPECODE, [1, 1, 2]), array(TYPECODE, [2, 3, 3]))
+        graph.set_edge(1, 2, False)
+        graph.set_edge(5, 1, True)
+
+        graph.compact()
+
+        self.assertEqual(graph.pending, 0)
+        self.assertEqual(graph.following(1), {3})
+        self.assertEqual(graph.followers(3), {1, 2})
+        self.assertEqual(graph.followers(1), {5})
+        self.assertTrue(graph.follows(5, 1))
+
+    def test_follow_view_uses_graph(self):
+        get_follow_graph()
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'graph_author'}
+        ))
+        self.assertEqual(Follow.objects.count(), 1)
+
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'graph_other'}
+        ))
+        self.assertTrue(
+            get_follow_graph().follows(self.reader.pk, self.other_author.pk)
+        )
+
+    def test_follow_view_survives_lagging_graph(self):
+        with mock.patch.object(FollowGraph, 'follows', return_value=False):
+            response = self.reader_client.get(reverse(
+                'posts:profile_follow', kwargs={'username': 'graph_author'}
+            ))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Follow.objects.count(), 1)
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.forms import PostForm
+from posts.identity import get_group, get_group_choices, get_user_id
+from posts.models import Group, Post
+
+
+User = get_user_model()
+
+
+class IdentityCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='identity_user')
+        cls.group = Group.objects.create(
+            title='Группа имён',
+            slug='identity_group',
+            description='Описание',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        local_cache.clear()
+
+    def test_username_is_resolved_once(self):
+        self.assertEqual(get_user_id('identity_user'), self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_id('identity_user'), self.user.pk)
+            local_cache.clear()
+            self.assertEqual(get_user_id('identity_user'), self.user.pk)
+
+    def test_missing_username_is_cached_until_signup(self):
+        self.assertIsNone(get_user_id('newcomer'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_user_id('newcomer'))
+
+        newcomer = User.objects.create_user(username='newcomer')
+
+        self.assertEqual(get_user_id('newcomer'), newcomer.pk)
+
+    def test_rename_drops_old_username(self):
+        user = User.objects.create_user(username='old_name')
+        get_user_id('old_name')
+
+        user.username = 'new_name'
+        user.save()
+
+        self.assertIsNone(get_user_id('old_name'))
+        self.assertEqual(get_user_id('new_name'), user.pk)
+
+    def test_group_change_drops_group_and_choices(self):
+        get_group('identity_group')
+        get_group_choices()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group('identity_group'), self.group)
+            PostForm().as_p()
+
+        Group.objects.create(
+            title='Новая группа', slug='new_group', description='Описание'
+        )
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+
+        self.assertEqual(
+            get_group('identity_group').title, 'Переименованная группа'
+        )
+        self.assertIn('Новая группа', PostForm().as_p())
+
+    def test_group_pages_follow_new_posts(self):
+        url = reverse('posts:group_posts', kwargs={'slug': 'identity_group'})
+        client = Client()
+        client.get(url)
+
+        for number in range(11):
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user, group=self.group
+            )
+
+        response = client.get(url, {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
@@ -0,0 +1,173 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageFieldsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='image_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_image_is_described_on_save(self):
+        post = Post.objects.get(pk=self.create_post().pk)
+
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest()
+        )
+
+    def test_removed_image_clears_description(self):
+        post = self.create_post()
+
+        post.image = None
+        post.save()
+
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_backfill_describes_old_images(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_color='',
+            image_hash='',
+        )
+
+        call_command('backfill_image_fields', stdout=StringIO())
+
+        filled = Post.objects.get(pk=post.pk)
+        self.assertEqual(filled.image_width, 2)
+        self.assertEqual(filled.image_hash, post.image_hash)
+        self.assertEqual(filled.version, post.version + 1)
+
+    def test_backfill_skips_decompression_bombs(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(image_hash='')
+        err = StringIO()
+
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 0.5):
+            call_command(
+                'backfill_image_fields', stdout=StringIO(), stderr=err
+            )
+
+        self.assertIn(post.image.name, err.getvalue())
+        self.assertEqual(Post.objects.get(pk=post.pk).image_hash, '')
+
+
+def png(size, mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageIngestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='ingest_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, content_type):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, content_type),
+        })
+
+    def test_create_normalises_format(self):
+        response = self.upload('small.gif', SMALL_GIF, 'image/gif')
+
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(author=self.user)
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+    def test_small_png_is_kept(self):
+        content = png((4, 2))
+
+        self.upload('small.png', content, 'image/png')
+
+        post = Post.objects.get(author=self.user)
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(content).hexdigest()
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=10)
+    def test_large_image_is_downscaled(self):
+        self.upload('large.png', png((40, 20), 'RGBA'), 'image/png')
+
+        post = Post.objects.get(author=self.user)
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual((post.image_width, post.image_height), (10, 5))
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=16)
+    def test_oversized_upload_is_refused(self):
+        response = self.upload('small.gif', SMALL_GIF, 'image/gif')
+
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 МБ.'
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=1)
+    def test_too_many_pixels_are_refused(self):
+        response = self.upload('small.gif', SMALL_GIF, 'image/gif')
+
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка 2x1 слишком большая.'
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import Comment, Follow, Group, Post
+from posts.publishing import page_path, publish_stale
+
+User = get_user_model()
+TEMP_PUBLISH_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PUBLISH_ROOT=TEMP_PUBLISH_ROOT)
+class PublishingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='publish_author')
+        cls.group = Group.objects.create(
+            title='Публикуемая группа',
+            slug='publish_group',
+            description='Описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_publish_group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Опубликованный пост', author=cls.user, group=cls.group
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PUBLISH_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        local_cache.clear()
+        shutil.rmtree(TEMP_PUBLISH_ROOT, ignore_errors=True)
+        call_command('publish_pages', all=True, stdout=StringIO())
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def read_page(self, url):
+        with open(page_path(url), encoding='utf-8') as page:
+            return page.read()
+
+    def test_all_pages_are_published(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'publish_group'}),
+            reverse('posts:profile', kwargs={'username': 'publish_author'}),
+            self.detail_url,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIn('Опубликованный пост', self.read_page(url))
+
+    def test_only_affected_pages_are_regenerated(self):
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+
+        self.assertFalse(os.path.exists(page_path(self.detail_url)))
+        urls = {url for url, _ in publish_stale()}
+
+        self.assertIn(self.detail_url, urls)
+        self.assertNotIn(
+            reverse(
+                'posts:group_posts', kwargs={'slug': 'other_publish_group'}
+            ),
+            urls,
+        )
+        self.assertIn('Исправленный пост', self.read_page(self.detail_url))
+        self.assertEqual(publish_stale(), [])
+
+    def test_comment_regenerates_post_page(self):
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        publish_stale()
+
+        self.assertIn('Новый комментарий', self.read_page(self.detail_url))
+
+    def test_deleted_post_is_unpublished(self):
+        post = Post.objects.create(text='Временный пост', author=self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        publish_stale()
+        self.assertTrue(os.path.exists(page_path(url)))
+
+        post.delete()
+        publish_stale()
+
+        self.assertFalse(os.path.exists(page_path(url)))
+
+    def test_follow_regenerates_author_post_pages(self):
+        reader = User.objects.create_user(username='publish_reader')
+        publish_stale()
+
+        Follow.objects.create(user=reader, author=self.user)
+
+        self.assertIn(self.detail_url, {url for url, _ in publish_stale()})
+
+    def test_dot_segment_urls_are_not_published(self):
+        user = User.objects.create_user(username='..')
+        Post.objects.create(text='Пост с точками', author=user)
+        url = reverse('posts:profile', kwargs={'username': '..'})
+
+        call_command('publish_pages', all=True, stdout=StringIO())
+
+        self.assertIsNone(page_path(url))
+        self.assertIsNone(page_path('/posts/./1/'))
+        index_page = self.read_page(reverse('posts:index'))
+        self.assertIn('Пост с точками', index_page)
+        self.assertNotIn('Всего постов', index_page)
+
+    def test_pages_are_published_at_decoded_paths(self):
+        user = User.objects.create_user(username='автор')
+        Post.objects.create(text='Пост кириллицей', author=user)
+        url = reverse('posts:profile', kwargs={'username': 'автор'})
+
+        publish_stale()
+
+        path = os.path.join(
+            settings.PUBLISH_ROOT, 'pages', 'profile', 'автор', 'index.html'
+        )
+        self.assertEqual(page_path(url), path)
+        self.assertIn('Пост кириллицей', self.read_page(url))
@@ -0,0 +1,98 @@
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from posts.caching import invalidate
+from posts.counters import change_post_comments
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import get_timeline
+
+
+User = get_user_model()
+
+
+class QueryCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='query_author')
+        cls.group = Group.objects.create(
+            title='Группа выборок',
+            slug='query_group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Пост выборки', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_repeated_queryset_is_served_from_cache(self):
+        list(Post.objects.for_listing().cached())
+        Post.objects.cached().count()
+
+        with self.assertNumQueries(0):
+            posts = list(Post.objects.for_listing().cached())
+            count = Post.objects.cached().count()
+
+        self.assertEqual(posts, [self.post])
+        self.assertEqual(count, 1)
+
+    def test_write_to_any_joined_table_changes_key(self):
+        posts = Post.objects.select_related('group').cached()
+        list(posts)
+
+        Group.objects.filter(pk=self.group.pk).update(title='Новое')
+        Group.objects.get(pk=self.group.pk).save()
+
+        self.assertEqual(posts.all()[0].group.title, 'Новое')
+
+    def test_counter_update_changes_key(self):
+        list(Post.objects.cached())
+
+        change_post_comments(self.post.pk, 1)
+
+        post = Post.objects.cached().get(pk=self.post.pk)
+        self.assertEqual(post.comments_count, 1)
+
+    def test_comment_previews_are_cached_with_posts(self):
+        posts = Post.objects.with_comment_preview(3).cached()
+        list(posts)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+
+        with self.assertNumQueries(2):
+            post, = posts.all()
+        with self.assertNumQueries(0):
+            post, = posts.all()
+
+        self.assertEqual(post.comment_preview[0].text, 'Свежий комментарий')
+
+    def test_scoped_queryset_follows_scope(self):
+        posts = Post.objects.cached(scopes=('index',))
+        list(posts)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+
+        post, = posts.all()
+        self.assertEqual(post.text, 'Пост выборки')
+        invalidate('index')
+        post, = posts.all()
+        self.assertEqual(post.text, 'Без сигнала')
+
+    def test_untracked_tables_are_not_cached(self):
+        timeline = get_timeline(self.user).cached()
+        list(timeline)
+
+        with self.assertNumQueries(1):
+            list(timeline.all())
+
+    def test_admin_uses_cached_querysets(self):
+        request = RequestFactory().get('/admin/')
+        for model in (Post, Group, Comment, Follow):
+            with self.subTest(model=model.__name__):
+                queryset = site._registry[model].get_queryset(request)
+                self.assertIsNotNone(queryset._cache_options)
@@ -0,0 +1,165 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+
+from posts import thumbnails
+from posts.cards import render_post_cards
+from posts.models import Post
+from posts.thumbnails import POST_THUMBNAILS, prefetch_thumbnails
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='thumbnail_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def get_thumbnail(self):
+        geometry, options = POST_THUMBNAILS[0]
+        return get_thumbnail(self.post.image, geometry, **options)
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_saving_post_with_image_schedules_thumbnails(self):
+        with mock.patch.object(thumbnails, 'submit') as submit, \
+                mock.patch.object(
+                    thumbnails.transaction, 'on_commit', lambda f: f()):
+            self.post.save()
+
+        submit.assert_called_once_with(self.post.image.name)
+
+    def test_pool_workers_inherit_storage_settings(self):
+        with mock.patch.object(thumbnails, 'ProcessPoolExecutor') as pool:
+            thumbnails.make_pool(1)
+
+        inherited, = pool.call_args.kwargs['initargs']
+        self.assertEqual(inherited['DATABASES'], settings.DATABASES)
+        self.assertEqual(inherited['CACHES'], settings.CACHES)
+        self.assertEqual(inherited['MEDIA_ROOT'], TEMP_MEDIA_ROOT)
+
+    def test_backfill_generates_every_geometry(self):
+        with mock.patch.object(thumbnails, 'get_thumbnail') as generate:
+            call_command('generate_thumbnails', workers=0, stdout=StringIO())
+
+        generate.assert_has_calls([
+            mock.call(self.post.image.name, geometry, **options)
+            for geometry, options in POST_THUMBNAILS
+        ])
+
+    def test_request_waits_for_thumbnail_in_progress(self):
+        with mock.patch.object(
+                ThumbnailBackend, '_create_thumbnail',
+                side_effect=lambda *args: args[-1].set_size((2, 1))):
+            thumbnail = self.get_thumbnail()
+        default.kvstore.clear()
+        # Другой процесс взял замок и собирает миниатюру.
+        lock = f'thumbnail-lock:{thumbnail.key}'
+        cache.add(lock, 1)
+
+        def finish(seconds):
+            default.storage.save(thumbnail.name, ContentFile(SMALL_GIF))
+            cache.delete(lock)
+
+        with mock.patch.object(thumbnails.time, 'sleep', finish), \
+                mock.patch.object(
+                    ThumbnailBackend, '_create_thumbnail') as make:
+            self.assertEqual(self.get_thumbnail().name, thumbnail.name)
+        make.assert_not_called()
+
+    def test_page_thumbnails_are_read_in_one_query(self):
+        posts = [self.post] + [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f'small_{number}.gif', SMALL_GIF, 'image/gif'
+                ),
+            )
+            for number in range(4)
+        ]
+        urls = []
+        for post in posts:
+            for geometry, options in POST_THUMBNAILS:
+                thumbnail = default.backend.thumbnail_file(
+                    post.image, geometry, **options
+                )
+                thumbnail.set_size((2, 1))
+                default.kvstore.set(thumbnail)
+                urls.append((post.pk, thumbnail.url))
+        cache.clear()
+
+        # Карточки авторов и записи о миниатюрах.
+        with self.assertNumQueries(2):
+            cards = dict(zip([post.pk for post in posts],
+                             render_post_cards(posts)))
+
+        for post_id, url in urls:
+            self.assertIn(url, cards[post_id])
+
+    def test_prefetch_sees_thumbnails_created_inside(self):
+        with prefetch_thumbnails([self.post.image]):
+            with mock.patch.object(
+                    ThumbnailBackend, '_create_thumbnail',
+                    side_effect=lambda *args: args[-1].set_size((2, 1))):
+                self.get_thumbnail()
+            with mock.patch.object(
+                    ThumbnailBackend, '_create_thumbnail') as make, \
+                    self.assertNumQueries(0):
+                self.get_thumbnail()
+        make.assert_not_called()
+
+    def test_picture_lists_webp_and_jpeg_widths(self):
+        for geometry, options in POST_THUMBNAILS:
+            thumbnail = default.backend.thumbnail_file(
+                self.post.image, geometry, **options
+            )
+            thumbnail.set_size((2, 1))
+            default.kvstore.set(thumbnail)
+
+        html = Template(
+            '{% load pictures %}{% picture image color=color %}'
+        ).render(Context({'image': self.post.image, 'color': '#123456'}))
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertEqual(html.count('.webp '), 3)
+        self.assertEqual(html.count('.jpg '), 3)
+        self.assertIn('1440w', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('background-color: #123456', html)
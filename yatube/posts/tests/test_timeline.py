@@ -0,0 +1,158 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+from posts.models import Post, Follow, TimelineEntry
+
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other_reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get_feed(self, **params):
+        response = TimelineTest.reader_client.get(
+            reverse('posts:follow_index'), params
+        )
+        return list(response.context['page_obj'].object_list)
+
+    def get_page(self, **params):
+        response = TimelineTest.reader_client.get(
+            reverse('posts:follow_index'), params
+        )
+        page = response.context['page_obj']
+        return list(page.object_list), page.paginator.next_cursor
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author
+        )
+
+        post = Post.objects.create(text='Новый пост', author=self.author)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=TimelineTest.reader, post=post
+            ).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                user=TimelineTest.other_reader
+            ).exists()
+        )
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+
+        TimelineTest.reader_client.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': TimelineTest.author.username}
+            )
+        )
+
+        self.assertEqual(self.get_feed(), posts[::-1])
+
+        TimelineTest.reader_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': TimelineTest.author.username}
+            )
+        )
+
+        self.assertEqual(self.get_feed(), [])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTest.reader).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author
+        )
+        Follow.objects.create(
+            user=TimelineTest.other_reader, author=TimelineTest.author
+        )
+
+        post = Post.objects.create(text='Популярный пост', author=self.author)
+
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists()
+        )
+        self.assertEqual(self.get_feed(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_cursor_pages_merge_fanned_out_and_popular_posts(self):
+        other_author = User.objects.create_user(username='other_author')
+        Follow.objects.create(user=self.reader, author=other_author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=self.author if i % 2 else other_author,
+            )
+            for i in range(13)
+        ][::-1]
+
+        first, cursor = self.get_page()
+        second, last_cursor = self.get_page(after=cursor)
+
+        self.assertEqual(first, posts[:10])
+        self.assertEqual(second, posts[10:])
+        self.assertIsNone(last_cursor)
+
+    def test_timeline_page_is_read_from_its_index(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        _, cursor = self.get_page()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(after=cursor)
+
+        sql = next(
+            query['sql'] for query in queries.captured_queries
+            if 'posts_timelineentry' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.reader
+            ).values_list('post_id', flat=True)),
+            {posts[1].pk, posts[2].pk},
+        )
@@ -10,8 +10,13 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
-from posts.models import Post, Group, Follow
+from posts.authors import get_author_card, get_author_cards
+from posts.caching import get_post_author_id
+from posts.models import Post, Group, Follow, Comment
 from posts.forms import PostForm
+from posts.loaders import COMMENT_COUNT, load_post_detail
+from posts.paginators import CountedPaginator
+from posts.views import COMMENT_PREVIEW_SIZE, POST_COUNT
 
 
 User = get_user_model()
@@ -282,6 +287,99 @@ class PostPaginatorTest(TestCase):
             response.context['page_obj'].has_other_pages
         )
 
+    def test_cursor_pages_of_group_page(self):
+        url = reverse(
+            'posts:group_posts',
+            kwargs={'slug': PostPaginatorTest.group.slug}
+        )
+        first_page = PostPaginatorTest.authorized_user.get(url)
+        next_cursor = first_page.context['page_obj'].paginator.next_cursor
+
+        second_page = PostPaginatorTest.authorized_user.get(
+            url, {'after': next_cursor}
+        )
+        page_obj = second_page.context['page_obj']
+        previous_cursor = page_obj.paginator.previous_cursor
+
+        self.assertEqual(
+            list(page_obj.object_list),
+            PostPaginatorTest.posts[1::-1]
+        )
+        self.assertTrue(page_obj.has_previous())
+        self.assertFalse(page_obj.has_next())
+
+        back_page = PostPaginatorTest.authorized_user.get(
+            url, {'before': previous_cursor}
+        )
+
+        self.assertEqual(
+            list(back_page.context['page_obj'].object_list),
+            list(first_page.context['page_obj'].object_list)
+        )
+
+    def test_cursor_pages_with_same_pub_date(self):
+        Post.objects.filter(author=PostPaginatorTest.user).update(
+            pub_date=PostPaginatorTest.posts[0].pub_date
+        )
+        url = reverse('posts:index')
+        first_page = PostPaginatorTest.authorized_user.get(url)
+        second_page = PostPaginatorTest.authorized_user.get(
+            url,
+            {'after': first_page.context['page_obj'].paginator.next_cursor}
+        )
+        seen = (
+            list(first_page.context['page_obj'].object_list)
+            + list(second_page.context['page_obj'].object_list)
+        )
+
+        self.assertEqual(len(seen), len(PostPaginatorTest.posts))
+        self.assertEqual(set(seen), set(PostPaginatorTest.posts))
+
+    def test_broken_cursor_gives_first_page(self):
+        response = PostPaginatorTest.authorized_user.get(
+            reverse('posts:index'), {'after': 'broken-cursor'}
+        )
+
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertEqual(
+            len(response.context['page_obj']),
+            PostPaginatorTest.count_page
+        )
+
+    def test_page_number_fallback(self):
+        response = PostPaginatorTest.authorized_user.get(
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostPaginatorTest.user.username}
+            ),
+            {'page': 2}
+        )
+
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_page_number_out_of_range(self):
+        response = PostPaginatorTest.authorized_user.get(
+            reverse(
+                'posts:group_posts',
+                kwargs={'slug': PostPaginatorTest.group.slug}
+            ),
+            {'page': 99}
+        )
+
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_page_window(self):
+        paginator = CountedPaginator(range(1000), 10, count=1000)
+        paginator.get_page(50)
+
+        self.assertEqual(
+            paginator.page_window,
+            [1, paginator.ELLIPSIS, 48, 49, 50, 51, 52, paginator.ELLIPSIS,
+             100]
+        )
+
 
 class PostFollowerTest(TestCase):
     @classmethod
@@ -381,3 +479,244 @@ class PostFollowerTest(TestCase):
             before_other_user_post_count,
             after_other_user_post_count
         )
+
+
+class ListingQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_user = Client()
+        cls.reader = User.objects.create_user(username='listing_reader')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Группа ленты',
+            slug='listing_group',
+            description='Описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'listing_author_{i}')
+            for i in range(POST_COUNT)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_posts(self, count):
+        for author in ListingQueriesTest.authors[:count]:
+            Post.objects.create(
+                text=f'Пост {author.username}',
+                author=author,
+                group=ListingQueriesTest.group,
+            )
+
+    def prime_author_cards(self):
+        # Карточки авторов живут в кеше, пока автор не изменится.
+        get_author_cards(author.pk for author in ListingQueriesTest.authors)
+
+    def assert_constant_queries(self, client, url, queries):
+        for count in (1, POST_COUNT):
+            with self.subTest(url=url, posts=count):
+                Post.objects.all().delete()
+                self.create_posts(count)
+                cache.clear()
+                self.prime_author_cards()
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(len(response.context['page_obj']), count)
+
+    def test_index_queries(self):
+        self.assert_constant_queries(
+            ListingQueriesTest.guest_user, reverse('posts:index'), 2
+        )
+
+    def test_group_queries(self):
+        self.assert_constant_queries(
+            ListingQueriesTest.guest_user,
+            reverse(
+                'posts:group_posts',
+                kwargs={'slug': ListingQueriesTest.group.slug}
+            ),
+            3
+        )
+
+    def test_profile_queries(self):
+        author = ListingQueriesTest.authors[0]
+        for count in (1, POST_COUNT):
+            with self.subTest(posts=count):
+                Post.objects.all().delete()
+                for i in range(count):
+                    Post.objects.create(text=f'Пост {i}', author=author)
+                cache.clear()
+                self.prime_author_cards()
+                with self.assertNumQueries(3):
+                    response = ListingQueriesTest.guest_user.get(
+                        reverse(
+                            'posts:profile',
+                            kwargs={'username': author.username}
+                        )
+                    )
+                self.assertEqual(len(response.context['page_obj']), count)
+
+    def test_follow_queries(self):
+        self.assert_constant_queries(
+            ListingQueriesTest.authorized_user,
+            reverse('posts:follow_index'),
+            4
+        )
+
+    def test_comment_preview_queries(self):
+        """Превью комментариев не добавляет запросов с ростом страницы."""
+        commentator = ListingQueriesTest.reader
+        for size in (1, 5, POST_COUNT):
+            with self.subTest(posts=size):
+                Post.objects.all().delete()
+                self.create_posts(size)
+                for post in Post.objects.all():
+                    for i in range(COMMENT_PREVIEW_SIZE + 2):
+                        Comment.objects.create(
+                            post=post, author=commentator, text=f'К {i}'
+                        )
+                with self.assertNumQueries(2):
+                    posts = list(
+                        Post.objects.for_listing().with_comment_preview(
+                            COMMENT_PREVIEW_SIZE
+                        )[:size]
+                    )
+                    [comment.author_username
+                     for post in posts for comment in post.comment_preview]
+                for post in posts:
+                    self.assertEqual(
+                        [comment.text for comment in post.comment_preview],
+                        ['К 2', 'К 3', 'К 4']
+                    )
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='detail_author')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Группа поста',
+            slug='detail_group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Пост с комментариями',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def add_comments(self, count):
+        for i in range(count):
+            commentator = User.objects.create_user(
+                username=f'commentator_{Comment.objects.count()}'
+            )
+            Comment.objects.create(
+                post=PostDetailQueriesTest.post,
+                author=commentator,
+                text=f'Комментарий {i}',
+            )
+
+    def test_loader_queries(self):
+        for count in (1, 5):
+            with self.subTest(comments=count):
+                self.add_comments(count)
+                get_author_card(PostDetailQueriesTest.user.pk)
+                with self.assertNumQueries(2):
+                    context = load_post_detail(PostDetailQueriesTest.post.pk)
+                    [comment.author.username
+                     for comment in context['comments']]
+                self.assertEqual(context['author'].posts_count, 1)
+
+    def test_view_queries_do_not_grow_with_comments(self):
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': PostDetailQueriesTest.post.pk}
+        )
+        # Автор поста нужен для версий кеша и запоминается навсегда.
+        get_post_author_id(PostDetailQueriesTest.post.pk)
+        get_author_card(PostDetailQueriesTest.user.pk)
+        for count in (1, 5):
+            with self.subTest(comments=count):
+                self.add_comments(count)
+                with self.assertNumQueries(4):
+                    PostDetailQueriesTest.authorized_user.get(url)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest_user = Client()
+        cls.user = User.objects.create_user(username='comment_author')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.user
+        )
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+            for i in range(COMMENT_COUNT + 5)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_first_page_is_bounded(self):
+        response = CommentPaginationTest.guest_user.get(
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': CommentPaginationTest.post.pk}
+            )
+        )
+        comments = response.context['comments']
+
+        self.assertEqual(
+            list(comments),
+            CommentPaginationTest.comments[:COMMENT_COUNT]
+        )
+        self.assertTrue(comments.has_next())
+
+    def test_fragment_loads_next_page(self):
+        post_id = CommentPaginationTest.post.pk
+        first_page = CommentPaginationTest.guest_user.get(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+        )
+        next_cursor = first_page.context['comments'].paginator.next_cursor
+
+        response = CommentPaginationTest.guest_user.get(
+            reverse('posts:post_comments', kwargs={'post_id': post_id}),
+            {'after': next_cursor}
+        )
+
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            CommentPaginationTest.comments[COMMENT_COUNT:]
+        )
+        self.assertFalse(response.context['comments'].has_next())
+        self.assertNotContains(response, '<html')
+
+    def test_fragment_of_missing_post_is_not_found(self):
+        post = Post.objects.create(text='Удалённый пост', author=self.user)
+        url = reverse('posts:post_comments', kwargs={'post_id': post.pk})
+        CommentPaginationTest.guest_user.get(url)
+        post.delete()
+
+        for url in (url, reverse(
+                'posts:post_comments', kwargs={'post_id': 10 ** 6})):
+            with self.subTest(url=url):
+                response = CommentPaginationTest.guest_user.get(url)
+                self.assertEqual(response.status_code, 404)
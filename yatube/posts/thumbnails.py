@@ -0,0 +1,232 @@
+"""Миниатюры картинок постов, собранные заранее.
+
+После сохранения поста с картинкой все миниатюры из POST_THUMBNAILS
+собираются в пуле процессов, и первый просмотр поста уже не ждёт
+Pillow. Одновременные сборки одной миниатюры объединяются бэкендом
+CoalescingThumbnailBackend: собирает первый, остальные ждут его.
+
+Записи о миниатюрах целой страницы читаются из хранилища sorl одним
+обращением, см. prefetch_thumbnails.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+# Картинка поста выводится полосой 960x339 в нескольких ширинах для
+# srcset: WebP для браузеров, которые его понимают, и JPEG для остальных.
+VARIANT_WIDTHS = (480, 960, 1440)
+VARIANT_FORMATS = (
+    ('image/webp', 'WEBP'),
+    ('image/jpeg', 'JPEG'),
+)
+# Для <img> без srcset и браузеров без WebP.
+FALLBACK_TYPE = 'image/jpeg'
+FALLBACK_WIDTH = 960
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * 339 / 960)}'
+
+
+def variant_options(image_format):
+    return {'crop': 'center', 'upscale': True, 'format': image_format}
+
+
+# Все миниатюры, которые выводят шаблоны постов.
+POST_THUMBNAILS = tuple(
+    (variant_geometry(width), variant_options(image_format))
+    for _, image_format in VARIANT_FORMATS
+    for width in VARIANT_WIDTHS
+)
+
+THUMBNAIL_LOCK_TIMEOUT = 60
+THUMBNAIL_WAIT = 10
+THUMBNAIL_POLL_INTERVAL = 0.05
+
+
+class CoalescingThumbnailBackend(ThumbnailBackend):
+    """Собирает миниатюру один раз, сколько бы процессов её ни просили.
+
+    Замок берётся в общем кеше только после промаха в хранилище
+    миниатюр, поэтому готовые миниатюры ничего не стоят.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл, который вернул бы get_thumbnail, без чтения хранилища.
+
+        Параметры дополняются так же, как в ThumbnailBackend.get_thumbnail.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        lock = f'thumbnail-lock:{thumbnail.key}'
+        if cache.add(lock, 1, THUMBNAIL_LOCK_TIMEOUT):
+            try:
+                return super()._create_thumbnail(
+                    source_image, geometry_string, options, thumbnail
+                )
+            finally:
+                cache.delete(lock)
+        deadline = time.monotonic() + THUMBNAIL_WAIT
+        while cache.get(lock) is not None and time.monotonic() < deadline:
+            time.sleep(THUMBNAIL_POLL_INTERVAL)
+        if thumbnail.exists():
+            thumbnail.set_size()
+            return None
+        return super()._create_thumbnail(
+            source_image, geometry_string, options, thumbnail
+        )
+
+
+class PrefetchingKVStore(KVStore):
+    """Хранилище sorl, которое отдаёт заранее прочитанные записи.
+
+    Внутри prefetch() записи перечисленных миниатюр берутся из словаря,
+    собранного одним get_many и одним запросом к базе, а не по одной
+    на каждый тег {% thumbnail %}.
+    """
+    local = threading.local()
+
+    @contextmanager
+    def prefetch(self, image_files):
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list(
+                    'key', 'value'
+                )
+            )
+            loaded = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                loaded, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(loaded)
+        previous = getattr(self.local, 'values', None)
+        self.local.values = values
+        try:
+            yield
+        finally:
+            self.local.values = previous
+
+    def _get_raw(self, key):
+        values = getattr(self.local, 'values', None)
+        if values is None or key not in values:
+            return super()._get_raw(key)
+        value = values[key]
+        if value == EMPTY_VALUE:
+            return None
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        values = getattr(self.local, 'values', None)
+        if values is not None and key in values:
+            values[key] = value
+
+
+def prefetch_thumbnails(files):
+    """Читает записи всех миниатюр POST_THUMBNAILS для картинок разом."""
+    image_files = [
+        default.backend.thumbnail_file(file_, geometry, **options)
+        for file_ in files if file_
+        for geometry, options in POST_THUMBNAILS
+    ]
+    return default.kvstore.prefetch(image_files)
+
+
+def get_variants(image):
+    """Миниатюры картинки: {MIME-тип: [(ширина, файл), ...]}."""
+    return {
+        mime_type: [
+            (width, get_thumbnail(
+                image, variant_geometry(width), **variant_options(image_format)
+            ))
+            for width in VARIANT_WIDTHS
+        ]
+        for mime_type, image_format in VARIANT_FORMATS
+    }
+
+
+def generate_thumbnails(name):
+    """Собирает все миниатюры картинки; возвращает её имя."""
+    for geometry, options in POST_THUMBNAILS:
+        get_thumbnail(name, geometry, **options)
+    return name
+
+
+# Настройки, которые процессы пула берут у родителя, а не считают
+# заново из модуля настроек: иначе при подменённых базе, кеше или
+# каталоге файлов они писали бы не туда, куда родитель.
+INHERITED_SETTINGS = ('DATABASES', 'CACHES', 'MEDIA_ROOT', 'TESTING')
+
+
+def init_worker(inherited):
+    for name, value in inherited.items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+def make_pool(workers):
+    # Новые процессы вместо fork: у сервера могут быть потоки и
+    # открытые соединения с базой.
+    inherited = {
+        name: getattr(settings, name) for name in INHERITED_SETTINGS
+    }
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(inherited,),
+    )
+
+
+pool = None
+pool_lock = threading.Lock()
+# Картинки, уже стоящие в очереди пула этого процесса.
+scheduled = set()
+
+
+def schedule(name):
+    """Ставит сборку миниатюр в пул после коммита транзакции."""
+    if settings.THUMBNAIL_WORKERS and name:
+        transaction.on_commit(lambda: submit(name))
+
+
+def submit(name):
+    global pool
+    with pool_lock:
+        if name in scheduled:
+            return
+        if pool is None:
+            pool = make_pool(settings.THUMBNAIL_WORKERS)
+        scheduled.add(name)
+        future = pool.submit(generate_thumbnails, name)
+    future.add_done_callback(lambda _: scheduled.discard(name))
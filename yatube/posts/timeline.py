@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .follow_graph import get_follow_graph
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import CursorPaginator, MergedCursorPaginator
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+PULL_AUTHORS_TIMEOUT = 300
+TIMELINE_TRIM_EVERY = 100
+
+
+def get_pull_author_ids():
+    """Возвращает id авторов, чьи посты не раскладываются по лентам.
+
+    У таких авторов слишком много подписчиков, поэтому их посты
+    подмешиваются в ленту при чтении. Множество небольшое и кешируется.
+    """
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(
+            AuthorStats.objects.filter(
+                followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, author_ids, PULL_AUTHORS_TIMEOUT)
+    return author_ids
+
+
+def get_followed_pull_authors(user):
+    pull_author_ids = get_pull_author_ids()
+    if not pull_author_ids:
+        return []
+    return sorted(pull_author_ids & get_follow_graph().following(user.pk))
+
+
+def get_timeline(user):
+    """Лента подписок: разложенные посты плюс посты популярных авторов.
+
+    Годится для подсчёта и страниц по номерам; курсорные страницы
+    строит get_timeline_paginator.
+    """
+    timeline = Q(
+        pk__in=TimelineEntry.objects.filter(user=user).values('post')
+    )
+    followed_pull_authors = get_followed_pull_authors(user)
+    if followed_pull_authors:
+        timeline |= Q(author__in=followed_pull_authors)
+    return Post.objects.filter(timeline)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный пагинатор по таблице ленты читателя.
+
+    Страница - это проход по индексу (user, -pub_date, -post) на
+    per_page + 1 записей ленты на любой глубине, а не сортировка всей
+    ленты; сами посты читаются в том же запросе по id из неё.
+    """
+
+    def __init__(self, user, per_page, posts):
+        super().__init__(
+            TimelineEntry.objects.filter(user=user).order_by(
+                '-pub_date', '-post_id'
+            ),
+            per_page,
+            key_lookups=('pub_date', 'post_id'),
+        )
+        self.posts = posts
+
+    def _rows(self, key, forward):
+        entries = self.object_list
+        if key is not None:
+            entries = entries.filter(self._beyond(key, forward))
+        # Записи ленты выбираются подзапросом, посты - тем же запросом;
+        # у поста та же дата, что у записи, по ней и восстанавливается
+        # порядок.
+        post_ids = entries.order_by(*self._ordering(forward)).values(
+            'post_id'
+        )[:self.per_page + 1]
+        return sorted(
+            self.posts.filter(pk__in=post_ids).order_by(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=forward == self.descending,
+        )
+
+
+def get_timeline_paginator(user, per_page, prepare=lambda posts: posts):
+    """Курсорный пагинатор ленты подписок.
+
+    Посты популярных авторов идут отдельным потоком по индексу постов
+    автора и сливаются с разложенными. prepare дополняет запросы
+    постов, например for_listing.
+    """
+    entries = TimelinePaginator(user, per_page, prepare(Post.objects.all()))
+    followed_pull_authors = get_followed_pull_authors(user)
+    if not followed_pull_authors:
+        return entries
+    pulled = CursorPaginator(
+        prepare(Post.objects.filter(author__in=followed_pull_authors)),
+        per_page,
+    )
+    return MergedCursorPaginator([entries, pulled], per_page)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit]
+    )
+    if len(follower_ids) >= limit:
+        # Автор стал популярным: дальше его посты читаются напрямую.
+        cache.delete(PULL_AUTHORS_KEY)
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+    # Ленты обрезаются не на каждом посте, а на каждом
+    # TIMELINE_TRIM_EVERY-м: так они перерастают предел ненамного,
+    # а раскладка поста не обходит все ленты подписчиков.
+    if post.pk % TIMELINE_TRIM_EVERY == 0:
+        for user_id in follower_ids:
+            trim(user_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def trim(user_id):
+    """Оставляет в ленте читателя TIMELINE_LENGTH последних постов."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    last_kept = entries.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id'
+    )[settings.TIMELINE_LENGTH - 1:settings.TIMELINE_LENGTH].first()
+    if last_kept is not None:
+        pub_date, post_id = last_kept
+        entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lt=post_id)
+        ).delete()
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow_changed(follow, created):
+    """Поддерживает ленту при подписке и отписке.
+
+    Если число подписчиков автора пересекает порог, множество
+    популярных авторов пересчитывается. Автор, опустившийся ниже
+    порога, возвращается к раскладке, и его подписчикам дописываются
+    посты, которые раньше подмешивались при чтении.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    followers_count = AuthorStats.objects.filter(
+        user_id=follow.author_id
+    ).values_list('followers_count', flat=True).first() or 0
+
+    if created:
+        if followers_count == limit:
+            cache.delete(PULL_AUTHORS_KEY)
+        if followers_count < limit:
+            backfill(follow.user_id, follow.author_id)
+        return
+
+    prune(follow.user_id, follow.author_id)
+    if followers_count == limit - 1:
+        cache.delete(PULL_AUTHORS_KEY)
+        follower_ids = Follow.objects.filter(
+            author_id=follow.author_id
+        ).values_list('user_id', flat=True)
+        for user_id in follower_ids:
+            backfill(user_id, follow.author_id)
@@ -0,0 +1,11 @@
+def chunks(queryset, chunk_size):
+    """Отдаёт записи пачками по возрастанию pk без OFFSET."""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[
+            :chunk_size
+        ])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
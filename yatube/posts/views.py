@@ -1,30 +1,59 @@
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .caching import get_post_author_id, versioned_cache_page
+from .counters import (
+    estimate_count, get_author_stats, get_group_posts_count,
+)
+from .follow_graph import get_follow_graph
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
+from .identity import get_group_or_404, get_user_id_or_404
+from .images import oversized_uploads
+from .loaders import get_comments_page, load_post_detail
+from .models import Post, Follow
+from .paginators import CountedPaginator, CursorPaginator
+from .timeline import get_timeline, get_timeline_paginator
 
 POST_COUNT = 10
+COMMENT_PREVIEW_SIZE = 3
 
 
-def get_pagination(request, elements, count_on_page):
-    paginator = Paginator(elements, count_on_page)
+def get_pagination(request, elements, count_on_page, count=None,
+                   cursor_paginator=None):
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    result = {'elements': page_obj, 'elements_count': paginator.count}
+
+    if page_number is None:
+        paginator = cursor_paginator or CursorPaginator(
+            elements, count_on_page
+        )
+        page_obj = paginator.get_cursor_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    else:
+        # Старые ссылки вида ?page=N продолжают работать через OFFSET,
+        # число постов берётся из счётчиков или кешированной оценки.
+        paginator = CountedPaginator(elements, count_on_page, count=count)
+        page_obj = paginator.get_page(page_number)
+
+    result = {'elements': page_obj, 'paginator': paginator}
 
     return result
 
 
-@cache_page(20, cache='default', key_prefix='index_page')
+@versioned_cache_page(lambda: ('index',))
 def index(request):
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
-    posts = Post.objects.select_related('group')
-    page_obj = get_pagination(request, posts, POST_COUNT)
+    posts = Post.objects.for_listing().with_comment_preview(
+        COMMENT_PREVIEW_SIZE
+    ).cached(scopes=('index',))
+    page_obj = get_pagination(
+        request, posts, POST_COUNT,
+        count=lambda: estimate_count('index', posts),
+    )
 
     context = {
         'title': title,
@@ -34,13 +63,19 @@ def index(request):
     return render(request, template, context)
 
 
+@versioned_cache_page(lambda slug: (f'group:{slug}',))
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
+    group = get_group_or_404(slug)
     title = group.title
 
-    posts = group.posts.all()
-    page_obj = get_pagination(request, posts, POST_COUNT)
+    posts = group.posts.for_listing().with_comment_preview(
+        COMMENT_PREVIEW_SIZE
+    ).cached(scopes=(f'group:{slug}',))
+    page_obj = get_pagination(
+        request, posts, POST_COUNT,
+        count=lambda: get_group_posts_count(group.pk),
+    )
 
     context = {
         'title': title,
@@ -51,59 +86,67 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@versioned_cache_page(lambda username: (f'profile:{username}',))
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    page_obj = get_pagination(request, posts, POST_COUNT)
-    following = False
-
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=user
-        ).exists()
-
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = get_author_stats(user)
+    posts = user.posts.for_listing().with_comment_preview(
+        COMMENT_PREVIEW_SIZE
+    ).cached(scopes=(f'profile:{username}',))
+    page_obj = get_pagination(
+        request, posts, POST_COUNT, count=stats.posts_count
+    )
     context = {
         'page_obj': page_obj['elements'],
-        'posts_count': page_obj['elements_count'],
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
         'title': f'Профайл пользователя {user.username}',
         'author': user,
-        'following': following,
     }
 
     return render(request, 'posts/profile.html', context)
 
 
+@versioned_cache_page(lambda post_id: (
+    f'post:{post_id}',
+    f'author:{get_post_author_id(post_id)}',
+))
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    user = get_object_or_404(User, username=post.author)
-    post_count = user.posts.count()
-    form = CommentForm()
-    comments = post.comments.all()
+    context = load_post_detail(
+        post_id, comments_after=request.GET.get('comments_after')
+    )
+    context['title'] = 'Пост ' + context['post'].text[0:30]
+    return render(request, 'posts/post_detail.html', context)
+
+
+@versioned_cache_page(lambda post_id: (f'post:{post_id}',))
+def post_comments(request, post_id):
+    if get_post_author_id(post_id) is None:
+        raise Http404(f'Пост {post_id} не найден')
+    comments = get_comments_page(post_id, after=request.GET.get('after'))
 
     context = {
-        'username': post.author,
-        'author_post_count': post_count,
-        'post': post,
-        'title': 'Пост ' + post.text[0:30],
-        'form': form,
+        'post_id': post_id,
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/includes/comment_list.html', context)
 
 
 @login_required
 def post_create(request):
-    if request.method == 'POST':
-        form = PostForm(request.POST)
-        if form.is_valid():
-            form_post = form.save(commit=False)
-            author = get_object_or_404(User, username=request.user.username)
-            form_post.author = author
-            form_post.save()
-            return redirect(f'/profile/{request.user.username}/')
-
-    form = PostForm()
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        oversized=oversized_uploads(request),
+    )
+    if form.is_valid():
+        form_post = form.save(commit=False)
+        form_post.author = request.user
+        form_post.save()
+        return redirect(f'/profile/{request.user.username}/')
 
     context = {
         'form': form
@@ -121,7 +164,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=oversized_uploads(request),
     )
 
     if form.is_valid():
@@ -152,8 +196,14 @@ def add_comment(request, post_id):
 def follow_index(request):
     title = 'Новости авторов, на которых я подписан'
 
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_pagination(request, posts, POST_COUNT)
+    posts = get_timeline(request.user).for_listing()
+    page_obj = get_pagination(
+        request, posts, POST_COUNT,
+        count=lambda: estimate_count(f'follow:{request.user.pk}', posts),
+        cursor_paginator=get_timeline_paginator(
+            request.user, POST_COUNT, lambda posts: posts.for_listing()
+        ),
+    )
 
     context = {
         'title': title,
@@ -165,20 +215,22 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    following = get_object_or_404(User, username=username)
-    data = {'user': request.user, 'author': following}
+    author_id = get_user_id_or_404(username)
 
-    if not (request.user.username == username
-            or Follow.objects.filter(**data).exists()):
-        Follow.objects.create(**data)
+    # Граф может отставать от подписки из другого процесса или
+    # повторной отправки, поэтому он только избавляет от запроса.
+    if not (request.user.pk == author_id
+            or get_follow_graph().follows(request.user.pk, author_id)):
+        Follow.objects.get_or_create(user=request.user, author_id=author_id)
 
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    subscribe = Follow.objects.filter(user=request.user, author=author)
+    subscribe = Follow.objects.filter(
+        user=request.user, author_id=get_user_id_or_404(username)
+    )
     subscribe.delete()
 
     return redirect('posts:profile', username=username)
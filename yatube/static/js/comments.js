@@ -0,0 +1,15 @@
+// Подгружает следующую страницу комментариев вместо кнопки "Показать ещё".
+document.addEventListener('click', function (event) {
+  const link = event.target.closest('#comments a[data-fragment]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.fragment)
+    .then(function (response) {
+      return response.text();
+    })
+    .then(function (html) {
+      link.parentElement.outerHTML = html;
+    });
+});
@@ -8,6 +8,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -146,9 +147,65 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сразу пишутся во временный файл, а не в память, и
+# обрываются на IMAGE_UPLOAD_MAX_SIZE байтах, см. posts.images.
+FILE_UPLOAD_HANDLERS = [
+    'posts.images.BoundedUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+# Картинки с большим числом пикселей отклоняются до декодирования,
+# а длинная сторона остальных уменьшается до IMAGE_MAX_SIDE.
+IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+IMAGE_MAX_SIDE = 2560
+
+# Тесты идут на своей базе и не должны трогать кеш сервера.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_FILE = 'test-cache.sqlite3' if TESTING else 'cache.sqlite3'
+
+# Кеш в файле SQLite общий для всех процессов сервера.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', CACHE_FILE),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'COMPRESS_MIN_SIZE': 1024,
+        },
+    },
+    # Кеш процесса перед общим для самых частых страниц.
+    'local': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'LOCATION': 'local',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
 }
+
+# Посты автора раскладываются по лентам подписчиков при публикации,
+# если подписчиков меньше этого порога, иначе подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_LIMIT = 500
+# Сколько последних постов хранится в ленте читателя; более старые
+# удаляются при подписке и время от времени при раскладке.
+TIMELINE_LENGTH = 1000
+
+# Хост, от имени которого команды publish_pages и warm_caches собирают
+# страницы в своём процессе; должен быть в ALLOWED_HOSTS.
+RENDER_HOST = 'localhost'
+
+# Каталог готовых страниц для гостей: веб-сервер отдаёт файлы из
+# PUBLISH_ROOT/pages сам, см. posts.publishing. None выключает публикацию.
+PUBLISH_ROOT = None
+
+# Одновременные сборки одной миниатюры объединяются, см. posts.thumbnails.
+THUMBNAIL_BACKEND = 'posts.thumbnails.CoalescingThumbnailBackend'
+# Сколько процессов собирают миниатюры новых картинок; 0 выключает
+# сборку заранее, и миниатюры собираются при первом показе. В тестах
+# выключено: тестовая база в памяти процессам пула не видна.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+# Миниатюры страницы читаются из хранилища sorl одним обращением.
+THUMBNAIL_KVSTORE = 'posts.thumbnails.PrefetchingKVStore'